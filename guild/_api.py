@@ -111,6 +111,8 @@ def _popen_args(
     force_deps=False,
     stop_after=None,
     fail_on_trial_error=False,
+    max_parallel=None,
+    max_parallel_steps=None,
     print_cmd=False,
     print_trials=False,
     save_trials=None,
@@ -120,6 +122,7 @@ def _popen_args(
     debug=False,
     test_sourcecode=False,
     gpus=None,
+    no_gpus=False,
     help_op=False,
     run_id=None,
     background=False,
@@ -199,12 +202,18 @@ def _popen_args(
         args.extend(["--stop-after", str(stop_after)])
     if fail_on_trial_error:
         args.append("--fail-on-trial-error")
+    if max_parallel is not None:
+        args.extend(["--max-parallel", str(max_parallel)])
+    if max_parallel_steps is not None:
+        args.extend(["--max-parallel-steps", str(max_parallel_steps)])
     if quiet:
         args.append("--quiet")
     if test_sourcecode:
         args.append("--test-sourcecode")
     if gpus:
         args.extend(["--gpus", str(gpus)])
+    if no_gpus:
+        args.append("--no-gpus")
     if help_op:
         args.append("--help-op")
     if run_id:
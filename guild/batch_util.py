@@ -18,6 +18,7 @@ import itertools
 import logging
 import os
 import random
+import shutil
 import signal
 import threading
 import typing
@@ -26,10 +27,12 @@ from guild import _api as gapi
 from guild import cli
 from guild import exit_code
 from guild import flag_util
-from guild import lock as locklib
 from guild import main
 from guild import op_util
+from guild import run as runlib
+from guild import run_manifest
 from guild import run_util
+from guild import sourcecode_store
 from guild import util
 from guild import var
 
@@ -38,8 +41,6 @@ log = logging.getLogger("guild")
 DEFAULT_MAX_TRIALS = 20
 DEFAULT_OBJECTIVE = "loss"
 
-RUN_STATUS_LOCK_TIMEOUT = 30
-
 # Enum for `prev_trials_mode` used in `trial_runs()` below
 PREV_TRIALS_BATCH = "batch"
 PREV_TRIALS_SOURCECODE = "sourcecode"
@@ -48,6 +49,8 @@ PREV_TRIALS_OPERATION = "operation"
 __trial_running_lock = threading.Lock()
 __batch_exiting = threading.Event()
 
+_matching_runs_cache = {}
+
 
 class CurrentRunNotBatchError(Exception):
     pass
@@ -137,11 +140,107 @@ def _save_trials_csv(trials, path):
 
 def _run_trials(batch_run, trials):
     trial_runs = _init_trial_runs(batch_run, trials)
-    run_status_lock = locklib.Lock(locklib.RUN_STATUS, timeout=RUN_STATUS_LOCK_TIMEOUT)
+    max_trials_parallel = max_parallel(batch_run)
+    if max_trials_parallel > 1 and not batch_run.get("stage_trials"):
+        _run_trials_parallel(trial_runs, batch_run, max_trials_parallel)
+        return
     for trial_run in trial_runs:
         if __batch_exiting.is_set():
             break
-        _start_pending_trial(trial_run, batch_run, run_status_lock)
+        _start_pending_trial(trial_run, batch_run)
+
+
+def _run_trials_parallel(trial_runs, batch_run, max_procs):
+    pending_trials = iter(trial_runs)
+
+    def next_trial(_running):
+        for trial_run in pending_trials:
+            if _claim_pending_trial(trial_run):
+                return trial_run
+        return None
+
+    run_trials_parallel(batch_run, next_trial, max_procs)
+
+
+def run_trials_parallel(batch_run, next_trial_cb, max_procs):
+    """Runs up to `max_procs` trials at a time in separate processes.
+
+    `next_trial_cb` is called with the list of running trials and
+    returns the next trial run to start or None if there are no more
+    trials to start. Trials are run using `guild run --restart`.
+
+    If a trial stops the batch (see `handle_trial_system_exit`) no
+    further trials are started and the batch exits once running
+    trials are finished.
+    """
+    from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+    running = {}
+    stop_batch = None
+    with ThreadPoolExecutor(max_workers=max_procs) as executor:
+        while True:
+            while (
+                len(running) < max_procs and stop_batch is None
+                and not __batch_exiting.is_set()
+            ):
+                trial_run = next_trial_cb(list(running.values()))
+                if trial_run is None:
+                    break
+                future = executor.submit(_run_trial_proc, trial_run, batch_run)
+                running[future] = trial_run
+            if not running:
+                break
+            done, _pending = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                del running[future]
+                try:
+                    future.result()
+                except SystemExit as e:
+                    stop_batch = stop_batch or e
+    if stop_batch:
+        raise stop_batch
+
+
+def _claim_pending_trial(trial_run):
+    # Run status markers are changed atomically (see
+    # `op_util.claim_staged_run`) so status is read without a lock.
+    trial_status = trial_run.status
+    if trial_status != "pending":
+        log.info(
+            "Skipping %s because its status is '%s' (expected 'pending')",
+            trial_run.id,
+            trial_status,
+        )
+        return False
+    return True
+
+
+def _run_trial_proc(trial_run, batch_run):
+    import subprocess
+    from guild import config
+
+    _log_start_trial(trial_run, False)
+    cmd = [
+        config.python_exe(),
+        "-um",
+        "guild.main_bootstrap",
+        "run",
+        "-y",
+        "--restart",
+        trial_run.id,
+    ]
+    cwd = os.getenv("PROJECT_DIR") or os.getenv("CMD_DIR")
+    returncode = _trial_proc_exit_code(subprocess.call(cmd, cwd=cwd))
+    if returncode != 0:
+        handle_trial_system_exit(SystemExit(returncode), batch_run, trial_run)
+
+
+def _trial_proc_exit_code(returncode):
+    # Negative exit codes used by Guild are reported by the OS as
+    # unsigned values.
+    if returncode == exit_code.KEYBOARD_INTERRUPT % 256:
+        return exit_code.KEYBOARD_INTERRUPT
+    return returncode
 
 
 def _init_trial_runs(batch_run, trials):
@@ -165,7 +264,7 @@ def _link_to_trial(batch_run, trial_run):
 
 def _init_trial_for_batch_proto(proto_run, trial_run, trial_flag_vals):
     op_util.set_run_pending(trial_run)
-    util.copytree(proto_run.dir, trial_run.dir)
+    _copy_proto_to_trial(proto_run, trial_run)
     trial_run.write_attr("id", trial_run.id)
     trial_run.write_attr("flags", trial_flag_vals)
     trial_run.write_attr("label", _trial_label(proto_run, trial_flag_vals))
@@ -174,22 +273,37 @@ def _init_trial_for_batch_proto(proto_run, trial_run, trial_flag_vals):
     op_util.set_run_started(trial_run)
 
 
+def _copy_proto_to_trial(proto_run, trial_run):
+    """Copies the batch proto to a trial run.
+
+    Trial source code files are cloned from the proto source code
+    files (see `sourcecode_store.FileCloner`). The trial inherits the
+    proto manifest and source code digest as its source code is the
+    same.
+    """
+    sourcecode_files = set(run_util.sourcecode_files(proto_run))
+    cloner = sourcecode_store.FileCloner()
+
+    def copy(src, dest):
+        relpath = run_manifest.normalize_path(os.path.relpath(src, proto_run.dir))
+        if relpath not in sourcecode_files:
+            return shutil.copy2(src, dest)
+        if not cloner.clone(src, dest):
+            shutil.copystat(src, dest)
+        return dest
+
+    util.copytree(proto_run.dir, trial_run.dir, copy_function=copy)
+
+
 def _trial_label(proto_run, trial_flag_vals):
     label_template = (proto_run.get("op") or {}).get("label_template")
     return op_util.run_label(label_template, trial_flag_vals)
 
 
-def _start_pending_trial(trial_run, batch_run, status_lock):
+def _start_pending_trial(trial_run, batch_run):
     stage = batch_run.get("stage_trials")
-    with status_lock:
-        trial_status = trial_run.status
-        if trial_status != "pending":
-            log.info(
-                "Skipping %s because its status is '%s' (expected 'pending')",
-                trial_run.id,
-                trial_status,
-            )
-            return
+    if not _claim_pending_trial(trial_run):
+        return
     try:
         start_trial_run(trial_run, stage)
     except SystemExit as e:
@@ -297,6 +411,11 @@ def fail_on_trial_error(batch_run):
     return params.get("fail_on_trial_error")
 
 
+def max_parallel(batch_run):
+    params = batch_run.get("run_params") or {}
+    return params.get("max_parallel") or 1
+
+
 def run_trial(batch_run, flag_vals):
     run = init_trial_run(batch_run, flag_vals)
     start_trial_run(run)
@@ -442,7 +561,11 @@ def trial_results(batch_run, scalars, prev_trials_mode=PREV_TRIALS_BATCH):
 
 def trial_results_for_runs(runs, scalars):
     index = _run_index_for_scalars(runs)
-    return [(run.get("flags"), _result_scalars(run, scalars, index)) for run in runs]
+    keys = [(prefix, tag, qualifier, False) for prefix, tag, qualifier in scalars]
+    run_scalars = index.run_scalars_bulk([run.id for run in runs], keys)
+    return [
+        (run.get("flags"), [run_scalars[run.id][key] for key in keys]) for run in runs
+    ]
 
 
 def trial_runs(batch_run, prev_trials_mode=PREV_TRIALS_BATCH):
@@ -491,6 +614,11 @@ def _apply_batch_runs_realpath(runs):
 
 def _proto_sourcecode_runs(batch_run):
     """Returns runs whose sourcecode digest matches that of a batch proto."""
+    if _use_matching_runs_cache():
+        return _cached_matching_runs(
+            _run_sourcecode_digest,
+            _proto_sourcecode_digest(batch_run.batch_proto),
+        )
     return var.runs(
         filter=_completed_sourcecode_filter(batch_run.batch_proto),
         sort=["timestamp"],
@@ -524,6 +652,11 @@ def _proto_sourcecode_digest(proto_run):
 
 def _proto_op_runs(batch_run):
     """Returns runs whose op matches that of a batch proto."""
+    if _use_matching_runs_cache():
+        return _cached_matching_runs(
+            _run_opspec,
+            run_util.format_operation(batch_run.batch_proto, nowarn=True),
+        )
     return var.runs(
         filter=_completed_op_filter(batch_run.batch_proto),
         sort=["timestamp"],
@@ -542,6 +675,115 @@ def _completed_op_filter(proto_run):
     return f
 
 
+def _use_matching_runs_cache():
+    # Runs limited to a parent aren't listed from the runs directory.
+    return not os.getenv("GUILD_RUNS_PARENT")
+
+
+def _cached_matching_runs(key_f, key):
+    root = var.runs_dir()
+    cache_key = (root, key_f, key)
+    try:
+        matching_runs = _matching_runs_cache[cache_key]
+    except KeyError:
+        matching_runs = _matching_runs_cache[cache_key] = MatchingRuns(root, key_f, key)
+    return matching_runs.completed_runs()
+
+
+def _run_sourcecode_digest(run):
+    return run.get("sourcecode_digest")
+
+
+def _run_opspec(run):
+    return run_util.format_operation(run, nowarn=True)
+
+
+class MatchingRuns:
+    """Completed runs under a root with a matching key.
+
+    `key_f` is called with a run and returns the key to match. Keys
+    must not change for a run once they're set (e.g. a run operation
+    or source code digest).
+
+    Runs are read from the run catalog when first used and keys are
+    read from catalog entries. Subsequent reads list the root
+    directory, read only runs that were added, and re-read matching
+    runs that were modified. Runs that don't match are not read again.
+    """
+    def __init__(self, root, key_f, key):
+        self.root = root
+        self._key_f = key_f
+        self._key = key
+        self._seen = None
+        self._matching = {}
+
+    def completed_runs(self):
+        if self._seen is None:
+            self._seen = set()
+            self._add_runs(_runs_with_mtimes(self.root))
+        else:
+            self._update()
+        completed = [
+            run for _mtimes, run, status in self._matching.values()
+            if status == "completed"
+        ]
+        return var.runs(base_runs=completed, sort=["timestamp"])
+
+    def _add_runs(self, runs):
+        for run, run_mtimes in runs:
+            key = self._key_f(run)
+            if key is None and run.status in ("pending", "staged"):
+                # Key may not be written yet - check again later.
+                continue
+            self._seen.add(run.id)
+            if key == self._key:
+                self._matching[run.id] = run_mtimes, run, run.status
+
+    def _update(self):
+        from guild import run_catalog
+
+        names = set(util.safe_listdir(self.root))
+        for name in self._seen - names:
+            self._seen.remove(name)
+            self._matching.pop(name, None)
+        new_names = sorted(names - self._seen)
+        mtimes = run_catalog.runs_mtimes(self.root, new_names)
+        self._add_runs(_runs_for_mtimes(self.root, mtimes))
+        self._refresh_matching()
+
+    def _refresh_matching(self):
+        from guild import run_catalog
+
+        for name, (mtimes, run, _status) in list(self._matching.items()):
+            cur_mtimes = run_catalog.run_mtimes(run.dir)
+            if cur_mtimes is None:
+                del self._matching[name]
+            elif cur_mtimes != mtimes:
+                run = runlib.Run(name, run.dir)
+                self._matching[name] = cur_mtimes, run, run.status
+
+
+def _runs_with_mtimes(root):
+    from guild import run_catalog
+
+    if os.getenv("NO_RUN_CATALOG") != "1":
+        runs = run_catalog.runs_with_mtimes(root)
+        if runs is not None:
+            return runs
+    # Read mtimes before runs so that a run that changes while it's
+    # being read is re-read later.
+    return _runs_for_mtimes(root, run_catalog.runs_mtimes(root))
+
+
+def _runs_for_mtimes(root, mtimes):
+    return [
+        (runlib.Run(name, os.path.join(root, name)), mtimes[name])
+        for name in sorted(mtimes)
+        # Skip dirs that aren't runs or aren't initialized yet
+        if os.path.exists(os.path.join(root, name, ".guild", "opref"))
+    ]
+
+
 def _run_index_for_scalars(runs):
     from guild import index as indexlib  # expensive
 
@@ -550,15 +792,6 @@ def _run_index_for_scalars(runs):
     return index
 
 
-def _result_scalars(run, scalars, index):
-    return [_run_scalar(run, scalar, index) for scalar in scalars]
-
-
-def _run_scalar(run, scalar, index):
-    prefix, tag, qualifier = scalar
-    return index.run_scalar(run, prefix, tag, qualifier, False)
-
-
 def handle_system_exit(e):
     main.handle_system_exit(e)
 
@@ -105,6 +105,16 @@ from . import runs_support
     type=click.Choice(["hiplot"]),
 )
 @click.option("--include-batch", is_flag=True, help="Include batch runs.")
+@click.option(
+    "-j",
+    "--jobs",
+    metavar="N",
+    type=click.IntRange(min=1),
+    help=(
+        "Number of processes used to read run scalars and attributes. "
+        "Defaults to the value of GUILD_INDEX_JOBS or 1 if not set."
+    ),
+)
 @click.option("--print-scalars", is_flag=True, help="Show available scalars and exit.")
 @runs_support.all_filters
 @click.pass_context
@@ -91,7 +91,7 @@ def _apply_strict_columns(args):
 
 def _print_scalars(args):
     runs = runs_impl.runs_for_args(args)
-    index = indexlib.RunIndex()
+    index = _run_index(args)
     index.refresh(runs, ["scalar"])
     for run in runs:
         cli.out(f"[{run.short_id}] {run_util.format_operation(run, nowarn=True)}")
@@ -100,6 +100,10 @@ def _print_scalars(args):
             cli.out(f"  {key}: {val:.6f} (step {step})")
 
 
+def _run_index(args):
+    return indexlib.RunIndex(jobs=getattr(args, "jobs", None))
+
+
 def _write_csv(args):
     data = get_compare_data(args, format_cells=False, skip_header_if_empty=True) or []
     with _open_file(args.csv) as out:
@@ -121,7 +125,7 @@ def _open_file(path):
 
 
 def get_compare_data(args, format_cells=True, skip_header_if_empty=False):
-    index = indexlib.RunIndex()
+    index = _run_index(args)
     cb = _get_data_cb(
         args,
         index,
@@ -151,7 +155,7 @@ def _print_table(args):
 
 def _tabview(args):
     config.set_log_output(True)
-    index = indexlib.RunIndex()
+    index = _run_index(args)
     tabview.view_runs(
         _get_data_cb(args, index), _get_run_detail_cb(index), _tabview_actions()
     )
@@ -318,26 +322,45 @@ def _user_cols(args, parse_cache):
 
 
 def _resolve_table_cols(table, index):
-    return [_resolve_table_section(run, section, index) for run, section in table]
+    scalars = _table_scalars(table, index)
+    return [
+        _resolve_table_section(run, section, index, scalars) for run, section in table
+    ]
+
+
+def _table_scalars(table, index):
+    keys = set()
+    for _run, section in table:
+        for cols in section:
+            keys.update(
+                _scalar_key(col) for col in cols if isinstance(col, query.Scalar)
+            )
+    if not keys:
+        return {}
+    return index.run_scalars_bulk([run.id for run, _section in table], keys)
+
+
+def _scalar_key(col):
+    prefix, tag = col.split_key()
+    return prefix, tag, col.qualifier, col.step
 
 
-def _resolve_table_section(run, section, index):
+def _resolve_table_section(run, section, index, scalars):
     # pylint: disable=consider-using-generator
-    return tuple([_resolve_run_cols(run, cols, index) for cols in section])
+    return tuple([_resolve_run_cols(run, cols, index, scalars) for cols in section])
 
 
-def _resolve_run_cols(run, cols, index):
-    return [(col.header, _col_data(run, col, index)) for col in cols]
+def _resolve_run_cols(run, cols, index, scalars):
+    return [(col.header, _col_data(run, col, index, scalars)) for col in cols]
 
 
-def _col_data(run, col, index):
+def _col_data(run, col, index, scalars):
     if isinstance(col, query.Flag):
         return index.run_flag(run, col.name)
     if isinstance(col, query.Attr):
         return index.run_attr(run, col.name)
     if isinstance(col, query.Scalar):
-        prefix, tag = col.split_key()
-        return index.run_scalar(run, prefix, tag, col.qualifier, col.step)
+        return scalars[run.id][_scalar_key(col)]
     assert False, col
 
 
@@ -413,6 +413,24 @@ def run_params(fn):
                 is_flag=True,
                 help="Stop batch operations when a trial exits with an error.",
             ),
+            click.Option(
+                ("--max-parallel",),
+                metavar="N",
+                type=click.IntRange(1, None),
+                help=(
+                    "Maximum number of trials to run concurrently in batch "
+                    "operations. Default is 1."
+                ),
+            ),
+            click.Option(
+                ("--max-parallel-steps",),
+                metavar="N",
+                type=click.IntRange(1, None),
+                help=(
+                    "Maximum number of steps to run concurrently in pipeline "
+                    "operations. Default is 1."
+                ),
+            ),
             click.Option(
                 ("--needed",),
                 is_flag=True,
@@ -642,6 +660,21 @@ def run(args):
     version of Python. When used across different versions of Python,
     the results may be inconsistent.
 
+    ### Run Trials in Parallel
+
+    By default, Guild runs trials one at a time. Use `--max-parallel`
+    to run up to `N` trials concurrently. Each trial is run in a
+    separate process. Bayesian optimizers suggest new trials while
+    other trials are running, treating each running trial as if it
+    had the best result found so far.
+
+    For operations that define `steps`, use `--max-parallel-steps` to
+    run up to `N` steps concurrently. A step runs after the steps
+    named in its `needs` attribute complete. By default, a step needs
+    the step before it. When a batch runs a pipeline, `--max-parallel`
+    applies to trials and `--max-parallel-steps` applies to the steps
+    of each trial.
+
     ### Preview or Save Trials
 
     When flag lists (used for grid search) or an optimizer is used,
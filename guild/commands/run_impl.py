@@ -1338,9 +1338,15 @@ def _on_dep_source_resolved(_op, resolved_source):
 
 
 def _on_run_initialized(op, run):
+    from guild import sourcecode_store
+
     _init_run_manifest(run)
-    _copy_run_sourcecode(run, op)
-    _write_run_sourcecode_digest(run)
+    hash_cache = sourcecode_store.HashCache()
+    try:
+        _copy_run_sourcecode(run, op, hash_cache)
+        _write_run_sourcecode_digest(run, hash_cache)
+    finally:
+        hash_cache.close()
     _write_run_vcs_commit(run, op)
 
 
@@ -1348,7 +1354,7 @@ def _init_run_manifest(run):
     util.touch(run.guild_path("manifest"))
 
 
-def _copy_run_sourcecode(run, op):
+def _copy_run_sourcecode(run, op, hash_cache):
     assert op._opdef
     opdef = op._opdef
     if os.getenv("NO_SOURCECODE") == "1":
@@ -1374,7 +1380,7 @@ def _copy_run_sourcecode(run, op):
         sourcecode_select,
         dest,
         ignore=_ignored_sourcecode_paths(op),
-        handler_cls=op_util.sourcecode_manifest_logger_cls(run.dir),
+        handler_cls=op_util.sourcecode_manifest_logger_cls(run.dir, hash_cache),
     )
 
 
@@ -1394,8 +1400,8 @@ def _sourcecode_dest(run, op):
     return os.path.join(run.dir, op._sourcecode_dest or ".")
 
 
-def _write_run_sourcecode_digest(run):
-    op_util.write_sourcecode_digest(run)
+def _write_run_sourcecode_digest(run, hash_cache):
+    op_util.write_sourcecode_digest(run, hash_cache)
 
 
 def _write_run_vcs_commit(run, op):
@@ -1457,6 +1463,7 @@ def _state_init_batch_op(S):
     _batch_op_init_opdef(S)
     _check_opt_flags_for_missing_batch_opdef(S)
     _check_batch_args_for_missing_batch_op(S)
+    _check_steps_args_for_missing_steps(S)
     _check_stage_trials_for_batch(S)
     if S.batch_op:
         _op_init_plugins(S.batch_op)
@@ -1593,6 +1600,17 @@ def _check_batch_args_for_missing_batch_op(S):
         return
     if S.args.max_trials:
         log.warning("not a batch run - ignoring --max-trials")
+    if S.args.max_parallel:
+        log.warning("not a batch run - ignoring --max-parallel")
+
+
+def _check_steps_args_for_missing_steps(S):
+    if S.args.max_parallel_steps and not _is_steps_op(S.user_op):
+        log.warning("not a pipeline operation - ignoring --max-parallel-steps")
+
+
+def _is_steps_op(op):
+    return bool(op._opdef and op._opdef.steps)
 
 
 def _check_stage_trials_for_batch(S):
@@ -317,8 +317,7 @@ class FileCopyHandler:
 
     def _try_copy_file(self, src, dest):
         try:
-            shutil.copyfile(src, dest)
-            shutil.copymode(src, dest)
+            return self._copy_file(src, dest)
         except IOError as e:
             if e.errno != 2:  # Ignore file not exists
                 if not self.handle_copy_error(e, src, dest):
@@ -326,6 +325,11 @@ class FileCopyHandler:
         except OSError as e:  # pylint: disable=duplicate-except
             if not self.handle_copy_error(e, src, dest):
                 raise
+        return None
+
+    def _copy_file(self, src, dest):
+        shutil.copyfile(src, dest)
+        shutil.copymode(src, dest)
 
     def ignore(self, _path, _rule_results):
         pass
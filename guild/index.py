@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
 import logging
 import os
 import sqlite3
@@ -23,9 +24,20 @@ from guild import var
 
 log = logging.getLogger("guild")
 
-VERSION = 1
+VERSION = 2
 DB_NAME = f"index_v{VERSION}.db"
 
+DB_TIMEOUT = 30.0
+
+SUMMARIZE_BATCH_SIZE = 100000
+
+MAX_QUERY_RUN_IDS = 500
+
+ScalarUpdate = collections.namedtuple(
+    "ScalarUpdate",
+    ["run_id", "path", "prefix", "digest", "summarized", "offsets", "base"],
+)
+
 CORE_ATTRS = {
     "id",
     "run",
@@ -46,8 +58,8 @@ class AttrReader:
     def __init__(self):
         self._data = {}
 
-    def refresh(self, runs):
-        self._data = _runs_attr_data(runs)
+    def refresh(self, runs, pool=None):
+        self._data = _runs_attr_data(runs, pool)
 
     def read(self, run, attr):
         run_data = self._data.get(run.id)
@@ -64,15 +76,22 @@ class AttrReader:
         return self._data.get(run.id)
 
 
-def _runs_attr_data(runs):
-    return {run.id: _run_attr_data(run) for run in runs}
+def _runs_attr_data(runs, pool=None):
+    if pool:
+        runs_logged_attrs = pool.map(_dir_logged_attrs, [run.dir for run in runs])
+    else:
+        runs_logged_attrs = [_run_logged_attrs(run) for run in runs]
+    return {
+        run.id: _run_attr_data(run, logged_attrs)
+        for run, logged_attrs in zip(runs, runs_logged_attrs)
+    }
 
 
-def _run_attr_data(run):
+def _run_attr_data(run, logged_attrs):
     # Order is important - core overrides user-defined attrs
     return {
         **_run_opdef_attrs(run),
-        **_run_logged_attrs(run),
+        **logged_attrs,
         **_run_core_attrs(run),
     }
 
@@ -82,9 +101,13 @@ def _run_opdef_attrs(run):
 
 
 def _run_logged_attrs(run):
+    return _dir_logged_attrs(run.dir)
+
+
+def _dir_logged_attrs(run_dir):
     attrs = {}
-    for path, reader in tfevent.attr_readers(run.dir):
-        prefix = _attr_prefix(path, run.dir)
+    for path, reader in tfevent.attr_readers(run_dir):
+        prefix = _attr_prefix(path, run_dir)
         for name, val in reader:
             attrs[_attr_name(prefix, name)] = val
     return attrs
@@ -157,29 +180,66 @@ class ScalarReader:
     def __init__(self, db):
         self._db = db
 
-    def refresh(self, runs):
-        for run in runs:
-            for path, cur_digest, reader in tfevent.scalar_readers(run.dir):
-                self._maybe_refresh_run_scalars(run, path, cur_digest, reader)
-
-    def _maybe_refresh_run_scalars(self, run, path, cur_digest, reader):
-        log.debug("Found events in %s (digest %s)", path, cur_digest)
-        prefix = _scalar_prefix(path, run.dir)
-        last_digest = self._scalar_source_digest(run.id, prefix)
-        if cur_digest != last_digest:
-            log.debug(
-                "Last digest for %s (%s) is stale, refreshing scalars",
-                path,
-                last_digest or 'unset',
+    def refresh(self, runs, pool=None):
+        if pool:
+            run_updates = pool.map(
+                _worker_run_scalar_updates,
+                [(run.id, run.dir) for run in runs],
+            )
+            self._write_updates(
+                [update for updates in run_updates for update in updates]
+            )
+        else:
+            self._write_updates(
+                [
+                    update for run in runs
+                    for update in self.run_scalar_updates(run.id, run.dir)
+                ]
             )
-            self._refresh_run_scalars(run, prefix, cur_digest, last_digest, reader)
 
-    def _refresh_run_scalars(self, run, prefix, cur_digest, last_digest, reader):
-        summarized = _summarize_scalars(reader)
-        if last_digest:
-            self._del_scalars(run.id, prefix)
-        self._write_summarized(run.id, prefix, summarized)
-        self._write_source_digest(run.id, prefix, cur_digest)
+    def run_scalar_updates(self, run_id, run_dir):
+        """Returns a list of scalar updates for a run.
+
+        Each update is a `ScalarUpdate` for an events directory with
+        new or changed events. The index is not modified. Use
+        `_write_updates` to apply the updates.
+        """
+        updates = []
+        for path, cur_digest, _reader in tfevent.scalar_readers(run_dir):
+            log.debug("Found events in %s (digest %s)", path, cur_digest)
+            prefix = _scalar_prefix(path, run_dir)
+            last_digest = self._scalar_source_digest(run_id, prefix)
+            if cur_digest != last_digest:
+                log.debug(
+                    "Last digest for %s (%s) is stale, refreshing scalars",
+                    path,
+                    last_digest or 'unset',
+                )
+                updates.append(self._scalar_update(run_id, path, prefix, cur_digest))
+        return updates
+
+    def _scalar_update(self, run_id, path, prefix, cur_digest):
+        # Read the indexed state in a single transaction so that
+        # offsets and summaries are consistent with one another. The
+        # state is saved with the update as its base - see
+        # `_write_updates`.
+        with self._db:
+            self._db.execute("BEGIN")
+            last_digest = self._scalar_source_digest(run_id, prefix)
+            offsets = self._scalar_file_offsets(run_id, prefix)
+            summarized = self._read_summarized(run_id, prefix) if offsets else {}
+        base = (last_digest, offsets)
+        reader = tfevent.IncrementalScalarReader(path, offsets)
+        if last_digest and reader.offsets and reader.can_resume():
+            log.debug("Reading new scalars from %s", path)
+        else:
+            log.debug("Reading all scalars from %s", path)
+            reader = tfevent.IncrementalScalarReader(path)
+            summarized = {}
+        _summarize_scalars(reader, summarized)
+        return ScalarUpdate(
+            run_id, path, prefix, cur_digest, summarized, reader.offsets, base
+        )
 
     def _scalar_source_digest(self, run_id, prefix):
         cur = self._db.execute(
@@ -194,61 +254,105 @@ class ScalarReader:
             return None
         return row[0]
 
-    def _del_scalars(self, run_id, prefix):
-        self._db.execute(
+    def _scalar_file_offsets(self, run_id, prefix):
+        cur = self._db.execute(
             """
-          DELETE from scalar
+          SELECT name, offset FROM scalar_file
           WHERE run = ? AND prefix = ?
         """,
             (run_id, prefix),
         )
+        return dict(cur.fetchall())
 
-    def _write_summarized(self, run_id, prefix, summarized):
-        cur = self._db.cursor()
-        for tag in summarized:
-            tsum = summarized[tag]
-            cur.execute(
-                """
-              INSERT INTO scalar
-              VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-                (
-                    run_id,
-                    prefix,
-                    tag,
-                    tsum.first_val,
-                    tsum.first_step,
-                    tsum.last_val,
-                    tsum.last_step,
-                    tsum.min_val,
-                    tsum.min_step,
-                    tsum.max_val,
-                    tsum.max_step,
-                    tsum.avg_val,
-                    tsum.total,
-                    tsum.count,
-                ),
-            )
-        self._db.commit()
+    def _read_summarized(self, run_id, prefix):
+        cur = self._db.execute(
+            """
+          SELECT * FROM scalar
+          WHERE run = ? AND prefix = ?
+        """,
+            (run_id, prefix),
+        )
+        return {row[2]: _tag_summary_for_row(row) for row in cur.fetchall()}
 
-    def _write_source_digest(self, run_id, prefix, path_digest):
-        cur = self._db.cursor()
-        cur.execute(
+    def _write_updates(self, updates):
+        """Writes scalar updates to the index.
+
+        An update is written only if the index state for its events
+        directory is unchanged since the update was read. Otherwise
+        another process has updated the index in the meantime and
+        events are read again using the new state.
+        """
+        while updates:
+            updates = self._try_write_updates(updates)
+
+    def _try_write_updates(self, updates):
+        with self._db:
+            # Lock the index for writing before checking update state.
+            self._db.execute("BEGIN IMMEDIATE")
+            current, stale = [], []
+            for update in updates:
+                state = self._scalar_state(update.run_id, update.prefix)
+                if state == update.base:
+                    current.append(update)
+                elif state[0] != update.digest:
+                    stale.append(update)
+            self._write_current_updates(current)
+        for update in stale:
+            log.debug("Scalars for %s changed while reading, re-reading", update.path)
+        return [
+            self._scalar_update(
+                update.run_id, update.path, update.prefix, update.digest
+            ) for update in stale
+        ]
+
+    def _scalar_state(self, run_id, prefix):
+        return (
+            self._scalar_source_digest(run_id, prefix),
+            self._scalar_file_offsets(run_id, prefix),
+        )
+
+    def _write_current_updates(self, updates):
+        if not updates:
+            return
+        keys = [(update.run_id, update.prefix) for update in updates]
+        self._db.executemany(
             """
-          UPDATE scalar_source
-            SET path_digest = ?
-            WHERE run = ? AND prefix = ?
+          DELETE FROM scalar
+          WHERE run = ? AND prefix = ?
         """,
-            (path_digest, run_id, prefix),
+            keys,
         )
-        cur.execute(
+        self._db.executemany(
             """
-          INSERT OR IGNORE INTO scalar_source
+          INSERT INTO scalar
+          VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+            _summarized_rows(updates),
+        )
+        self._db.executemany(
+            """
+          DELETE FROM scalar_file
+          WHERE run = ? AND prefix = ?
+        """,
+            keys,
+        )
+        self._db.executemany(
+            """
+          INSERT INTO scalar_file
+          VALUES (?, ?, ?, ?)
+        """,
+            [
+                (update.run_id, update.prefix, name, offset) for update in updates
+                for name, offset in update.offsets.items()
+            ],
+        )
+        self._db.executemany(
+            """
+          INSERT OR REPLACE INTO scalar_source
           VALUES (?, ?, ?)
         """,
-            (run_id, prefix, path_digest),
+            [(update.run_id, update.prefix, update.digest) for update in updates],
         )
-        self._db.commit()
 
     def read(self, run, prefix, tag, qual, step):
         col_index = self._read_col_index(qual, step)
@@ -275,6 +379,47 @@ class ScalarReader:
             return None
         return row[col_index]
 
+    def read_bulk(self, run_ids, keys):
+        keys = list(keys)
+        col_indexes = {key: self._read_col_index(key[2], key[3]) for key in keys}
+        keys_for_tag = {}
+        for key in keys:
+            keys_for_tag.setdefault(key[:2], []).append(key)
+        result = {run_id: dict.fromkeys(keys) for run_id in run_ids}
+        for (prefix, tag), tag_keys in keys_for_tag.items():
+            for run_id, row in self._first_rows(list(result), prefix, tag).items():
+                run_vals = result[run_id]
+                for key in tag_keys:
+                    run_vals[key] = row[col_indexes[key]]
+        return result
+
+    def _first_rows(self, run_ids, prefix, tag):
+        """Returns the first scalar row for prefix and tag by run ID.
+
+        Rows are selected using the same criteria as `read`.
+        """
+        rows = {}
+        for i in range(0, len(run_ids), MAX_QUERY_RUN_IDS):
+            chunk = run_ids[i:i + MAX_QUERY_RUN_IDS]
+            run_params = ", ".join(["?"] * len(chunk))
+            if prefix is None:
+                prefix_cond = ""
+                params = (tag, *chunk)
+            else:
+                prefix_cond = "AND prefix LIKE ?"
+                params = (tag, f"{prefix}%", *chunk)
+            cur = self._db.execute(
+                f"""
+              SELECT * FROM scalar
+              WHERE tag = ? {prefix_cond} AND run IN ({run_params})
+              ORDER BY run, prefix
+            """,
+                params,
+            )
+            for row in cur:
+                rows.setdefault(row[0], row)
+        return rows
+
     def _read_col_index(self, qual, step):
         try:
             return self._col_index_map[(qual or "last", step)]
@@ -303,17 +448,80 @@ def _scalar_prefix(scalars_path, root):
     return rel_path.replace(os.sep, "/")
 
 
-def _summarize_scalars(reader):
-    summarized = {}
+def _summarize_scalars(reader, summarized=None):
+    """Summarizes scalars from reader by tag.
+
+    If `summarized` is specified, scalars are added to the existing
+    tag summaries.
+
+    Scalars are buffered by tag and applied to tag summaries in
+    batches of up to `SUMMARIZE_BATCH_SIZE` values.
+    """
+    summarized = {} if summarized is None else summarized
+    pending = {}
+    pending_count = 0
     for tag, val, step in reader:
-        # Don't use dict.setdefault to avoid repeated calls to
-        # TagSummary.
+        try:
+            vals, steps = pending[tag]
+        except KeyError:
+            pending[tag] = vals, steps = [], []
+        vals.append(val)
+        steps.append(step)
+        pending_count += 1
+        if pending_count >= SUMMARIZE_BATCH_SIZE:
+            _apply_pending_scalars(pending, summarized)
+            pending = {}
+            pending_count = 0
+    _apply_pending_scalars(pending, summarized)
+    return summarized
+
+
+def _apply_pending_scalars(pending, summarized):
+    for tag, (vals, steps) in pending.items():
         try:
             tag_summary = summarized[tag]
         except KeyError:
             summarized[tag] = tag_summary = TagSummary()
-        tag_summary.add(val, step)
-    return summarized
+        tag_summary.add_batch(vals, steps)
+
+
+def _summarized_rows(updates):
+    for update in updates:
+        for tag, tsum in update.summarized.items():
+            yield (
+                update.run_id,
+                update.prefix,
+                tag,
+                tsum.first_val,
+                tsum.first_step,
+                tsum.last_val,
+                tsum.last_step,
+                tsum.min_val,
+                tsum.min_step,
+                tsum.max_val,
+                tsum.max_step,
+                tsum.avg_val,
+                tsum.total,
+                tsum.count,
+            )
+
+
+def _tag_summary_for_row(row):
+    tag_summary = TagSummary()
+    (
+        tag_summary.first_val,
+        tag_summary.first_step,
+        tag_summary.last_val,
+        tag_summary.last_step,
+        tag_summary.min_val,
+        tag_summary.min_step,
+        tag_summary.max_val,
+        tag_summary.max_step,
+        tag_summary.avg_val,
+        tag_summary.total,
+        tag_summary.count,
+    ) = row[3:]
+    return tag_summary
 
 
 class TagSummary:
@@ -339,6 +547,53 @@ class TagSummary:
         self.count += 1
         self.avg_val = self.total / self.count
 
+    def add_batch(self, vals, steps):
+        """Adds a batch of values and corresponding steps.
+
+        The result is the same as calling `add` for each value and
+        step in order.
+        """
+        if not vals:
+            return
+        import numpy as np
+
+        vals = np.asarray(vals, dtype=np.float64)
+        steps = np.asarray(steps, dtype=np.int64)
+        # argmin/argmax return the first occurrence, which matches the
+        # strict comparisons used for first, min, and max. Last uses
+        # `>=` and so takes the last occurrence of the max step.
+        i = int(steps.argmin())
+        self._set_first(float(vals[i]), int(steps[i]))
+        i = len(steps) - 1 - int(steps[::-1].argmax())
+        self._set_last(float(vals[i]), int(steps[i]))
+        self._add_batch_min_max(vals, steps)
+        # Accumulate sequentially to match the rounding of `add`. Sums
+        # of inf and -inf are NaN, as with `add`, without warnings.
+        with np.errstate(invalid="ignore"):
+            totals = np.add.accumulate(np.append(self.total, vals))
+        self.total = float(totals[-1])
+        self.count += len(vals)
+        self.avg_val = self.total / self.count
+
+    def _add_batch_min_max(self, vals, steps):
+        import numpy as np
+
+        # NaN values are never less or greater than other values and so
+        # are only used for min and max when they're the first value.
+        if self.min_val is None and np.isnan(vals[0]):
+            self.min_val = self.max_val = float(vals[0])
+            self.min_step = self.max_step = int(steps[0])
+            return
+        not_nan = ~np.isnan(vals)
+        if not not_nan.any():
+            return
+        vals = vals[not_nan]
+        steps = steps[not_nan]
+        i = int(vals.argmin())
+        self._set_min(float(vals[i]), int(steps[i]))
+        i = int(vals.argmax())
+        self._set_max(float(vals[i]), int(steps[i]))
+
     def _set_first(self, val, step):
         if self.first_step is None or step < self.first_step:
             self.first_val = val
@@ -361,9 +616,16 @@ class TagSummary:
 
 
 class RunIndex:
-    """Interface for using a run index."""
-    def __init__(self, path=None):
+    """Interface for using a run index.
+
+    `jobs` is the number of processes used to read run attributes and
+    scalars when refreshing the index. If `jobs` is not specified, the
+    value of `GUILD_INDEX_JOBS` is used, or 1 if that variable isn't
+    set.
+    """
+    def __init__(self, path=None, jobs=None):
         self.path = path or var.cache_dir("runs")
+        self.jobs = jobs or _default_refresh_jobs()
         self._db = self._init_db()
         self._attr_reader = AttrReader()
         self._flag_reader = FlagReader()
@@ -372,7 +634,7 @@ class RunIndex:
     def _init_db(self):
         db_path = self._db_path()
         util.ensure_dir(os.path.dirname(db_path))
-        db = sqlite3.connect(db_path)
+        db = _connect(db_path)
         _init_run_index_tables(db)
         return db
 
@@ -385,13 +647,29 @@ class RunIndex:
         `runs` is list of runs or run IDs for each run to refresh.
 
         `types` is an optional list of data types to refresh.
+
+        If `jobs` is greater than 1, run event files are read in
+        parallel by worker processes. Changes are written to the index
+        by the calling process.
         """
-        if types is None or "attr" in types:
-            self._attr_reader.refresh(runs)
-        if types is None or "flag" in types:
-            self._flag_reader.refresh(runs)
-        if types is None or "scalar" in types:
-            self._scalar_reader.refresh(runs)
+        pool = self._refresh_pool(runs, types)
+        try:
+            if types is None or "attr" in types:
+                self._attr_reader.refresh(runs, pool)
+            if types is None or "flag" in types:
+                self._flag_reader.refresh(runs)
+            if types is None or "scalar" in types:
+                self._scalar_reader.refresh(runs, pool)
+        finally:
+            if pool:
+                pool.close()
+
+    def _refresh_pool(self, runs, types):
+        if self.jobs < 2 or len(runs) < 2:
+            return None
+        if types is not None and "attr" not in types and "scalar" not in types:
+            return None
+        return _RefreshPool(self._db_path(), min(self.jobs, len(runs)), len(runs))
 
     def run_attr(self, run, name):
         return self._attr_reader.read(run, name)
@@ -408,6 +686,79 @@ class RunIndex:
     def run_scalars(self, run):
         return list(self._scalar_reader.iter_scalars(run))
 
+    def run_scalars_bulk(self, run_ids, keys):
+        """Returns scalar values for multiple runs.
+
+        `keys` is a list of `(prefix, tag, qual, step)` tuples, which
+        correspond to the arguments to `run_scalar`.
+
+        Returns a dict of run ID to a dict of key to scalar value. If a
+        run doesn't have a scalar for a key, its value is None.
+        """
+        return self._scalar_reader.read_bulk(run_ids, keys)
+
+
+def _connect(db_path):
+    db = sqlite3.connect(db_path, timeout=DB_TIMEOUT)
+    try:
+        # WAL lets processes read the index while another process
+        # writes to it. The index is a cache and doesn't need a full
+        # sync on each commit.
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+    except sqlite3.OperationalError as e:
+        log.debug("cannot configure run index %s: %s", db_path, e)
+    return db
+
+
+def _default_refresh_jobs():
+    val = os.getenv("GUILD_INDEX_JOBS")
+    if not val:
+        return 1
+    try:
+        jobs = int(val)
+    except ValueError:
+        log.warning("invalid value for GUILD_INDEX_JOBS %r - using 1", val)
+        return 1
+    else:
+        return max(jobs, 1)
+
+
+class _RefreshPool:
+    """Process pool used to read run event files in parallel.
+
+    Workers open the index for reading only. All writes to the index
+    are made by the process that creates the pool.
+    """
+    def __init__(self, db_path, jobs, run_count):
+        from concurrent.futures import ProcessPoolExecutor
+
+        self._executor = ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=_init_refresh_worker,
+            initargs=(db_path,),
+        )
+        self._chunksize = max(1, run_count // (jobs * 4))
+
+    def map(self, f, items):
+        return list(self._executor.map(f, items, chunksize=self._chunksize))
+
+    def close(self):
+        self._executor.shutdown()
+
+
+_worker_scalar_reader = None
+
+
+def _init_refresh_worker(db_path):
+    global _worker_scalar_reader
+    _worker_scalar_reader = ScalarReader(_connect(db_path))
+
+
+def _worker_run_scalar_updates(run_id_and_dir):
+    run_id, run_dir = run_id_and_dir
+    return _worker_scalar_reader.run_scalar_updates(run_id, run_dir)
+
 
 def _init_run_index_tables(db):
     db.execute(
@@ -451,6 +802,22 @@ def _init_run_index_tables(db):
       ON scalar_source (run, prefix)
     """
     )
+    db.execute(
+        """
+      CREATE TABLE IF NOT EXISTS scalar_file (
+        run,
+        prefix,
+        name,
+        offset
+      )
+    """
+    )
+    db.execute(
+        """
+      CREATE UNIQUE INDEX IF NOT EXISTS scalar_file_pk
+      ON scalar_file (run, prefix, name)
+    """
+    )
 
 
 def iter_run_scalars(run):
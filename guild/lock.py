@@ -28,6 +28,8 @@ elif hasattr(filelock, "_api"):
 
 Timeout = filelock.Timeout
 
+# Deprecated - run status changes don't use a system wide lock. Staged
+# runs are claimed using `op_util.claim_staged_run`.
 RUN_STATUS = "run-status"
 
 
@@ -32,13 +32,13 @@ This is true of Guild file configuration as well. Refer to "design
 notes" in `guild.guildfile` module source code for additional thougts.
 """
 
+import collections
 import csv
 import importlib
 import io
 import logging
 import os
 import re
-import struct
 import sys
 import threading
 import time
@@ -58,6 +58,7 @@ from guild import op_dep
 from guild import run as runlib
 from guild import run_manifest
 from guild import run_util
+from guild import sourcecode_store
 from guild import util
 from guild import var
 from guild import vcs_util
@@ -76,7 +77,10 @@ STEPS_EXEC = "${guild_python_exe} -um guild.steps_main"
 LABEL_TOKENS_P = re.compile(r"(\${.+?})")
 LABEL_FLAG_REF_P = re.compile(r"\${(.+?)}")
 
-RUN_OUTPUT_STREAM_BUFFER = 4096
+RUN_OUTPUT_STREAM_BUFFER = 65536
+
+# Bytes below TAB are omitted from lines passed to output callbacks.
+NON_PRINTABLE_OUTPUT = bytes(range(9))
 
 RESTART_NEEDED_STATUS = ("pending",)
 
@@ -241,6 +245,8 @@ class RunOutput:
         self._index = None
         self._out_tee = None
         self._err_tee = None
+        self._output_pos = 0
+        self._line_offsets = collections.deque([0])
 
     @property
     def closed(self):
@@ -262,6 +268,8 @@ class RunOutput:
         self._proc = proc
         self._output = self._open_output()
         self._index = self._open_index()
+        self._output_pos = 0
+        self._line_offsets = collections.deque([0])
         self._out_tee = threading.Thread(target=self._out_tee_run)
         self._out_tee.start()
         if proc.stderr:
@@ -284,7 +292,10 @@ class RunOutput:
 
     def _open_index(self):
         path = self._run.guild_path("output.index")
-        return open(path, "wb")
+        f = open(path, "wb")
+        f.write(util.RUN_OUTPUT_INDEX_HEADER)
+        f.flush()
+        return f
 
     def _out_tee_run(self):
         assert self._proc
@@ -310,35 +321,70 @@ class RunOutput:
         output_fileno = self._output.fileno()
         index_fileno = self._index.fileno()
         lock = self._output_lock
-        line = []
+        partial_line = []
         while True:
             buf = os_read(input_fileno, RUN_OUTPUT_STREAM_BUFFER)
             if not buf:
-                if line:
-                    self._output_eol(index_fileno, line, stream_type)
+                last_line = _printable_output(b"".join(partial_line))
+                if last_line:
+                    with lock:
+                        self._output_lines(index_fileno, [last_line], stream_type)
                 break
             with lock:
                 if stream_fileno is not None:
                     os_write(stream_fileno, buf)
                 os_write(output_fileno, buf)
-                for b in buf:
-                    if b < 9:  # non-printable
-                        continue
-                    line.append(b)
-                    if b == 10:  # LF
-                        self._output_eol(index_fileno, line, stream_type)
-                        del line[:]
-
-    def _output_eol(self, index_fileno, line, stream_type):
-        line_bytes = bytes(line)
-        entry = struct.pack("!QB", time.time_ns() // 1000000, stream_type)
-        os.write(index_fileno, entry)
+                self._add_line_offsets(buf)
+                lines = buf.split(b"\n")
+                if len(lines) == 1:
+                    partial_line.append(buf)
+                    continue
+                partial_line.append(lines[0])
+                lines[0] = b"".join(partial_line)
+                partial_line = [lines.pop()]
+                self._output_lines(
+                    index_fileno,
+                    [_printable_output(line) + b"\n" for line in lines],
+                    stream_type,
+                )
+
+    def _add_line_offsets(self, buf):
+        # Record the output offset of each line that starts in buf.
+        # Line offsets are used in order as lines are indexed.
+        pos = self._output_pos
+        i = buf.find(b"\n")
+        while i != -1:
+            self._line_offsets.append(pos + i + 1)
+            i = buf.find(b"\n", i + 1)
+        self._output_pos = pos + len(buf)
+
+    def _output_lines(self, index_fileno, lines, stream_type):
+        # Lines read together share a time and are indexed with a
+        # single write.
+        line_time = time.time_ns() // 1000000
+        pack_entry = util.RUN_OUTPUT_INDEX_ENTRY.pack
+        os.write(
+            index_fileno,
+            b"".join(
+                [
+                    pack_entry(line_time, stream_type, self._next_line_offset())
+                    for _ in lines
+                ]
+            ),
+        )
         if self._output_cb:
-            try:
-                self._output_cb.write(line_bytes)
-            except Exception:
-                log.exception("error in output callback (will be removed)")
-                self._output_cb = None
+            for line in lines:
+                try:
+                    self._output_cb.write(line)
+                except Exception:
+                    log.exception("error in output callback (will be removed)")
+                    self._output_cb = None
+                    break
+
+    def _next_line_offset(self):
+        if self._line_offsets:
+            return self._line_offsets.popleft()
+        return self._output_pos
 
     def wait(self):
         """Wait for run output reader threads to exit.
@@ -402,6 +448,10 @@ class RunOutput:
         self.close()
 
 
+def _printable_output(line):
+    return line.translate(None, NON_PRINTABLE_OUTPUT)
+
+
 ###################################################################
 # OpDef for spec
 ###################################################################
@@ -643,23 +693,45 @@ def init_run(path=None):
 def set_run_marker(run, marker):
     util.ensure_dir(run.guild_path())
     open(run.guild_path(marker), "w").close()
+    run.reset_catalog_entry()
 
 
 def clear_run_marker(run, marker):
     util.ensure_deleted(run.guild_path(marker))
+    run.reset_catalog_entry()
 
 
 def set_run_pending(run):
-    set_run_marker(run, "PENDING")
-    clear_run_marker(run, "STAGED")
+    if not claim_staged_run(run):
+        set_run_marker(run, "PENDING")
+        clear_run_marker(run, "STAGED")
+
+
+def claim_staged_run(run):
+    """Changes the status of a staged run to pending.
+
+    Returns True if the run status is changed, otherwise returns False.
+
+    The run `STAGED` marker is renamed to `PENDING`. Rename is atomic,
+    so when more than one process claims the same staged run, only
+    one succeeds. Processes that start staged runs use this to claim
+    a run without a system wide lock.
+    """
+    try:
+        os.rename(run.guild_path("STAGED"), run.guild_path("PENDING"))
+    except (FileNotFoundError, FileExistsError):
+        return False
+    else:
+        run.reset_catalog_entry()
+        return True
 
 
 def clear_run_pending(run):
     clear_run_marker(run, "PENDING")
 
 
-def write_sourcecode_digest(run):
-    digest = run_util.sourcecode_digest(run)
+def write_sourcecode_digest(run, hash_cache=None):
+    digest = run_util.sourcecode_digest(run, hash_cache)
     run.write_attr("sourcecode_digest", digest)
 
 
@@ -1019,11 +1091,60 @@ class SourceCodeCopyHandler(file_util.FileCopyHandler):
 
     _warned_max_matches = False
 
+    # Hash cache shared with the caller, which is responsible for
+    # closing it. If not set, the handler uses its own cache.
+    hash_cache = None
+
     _warning_help_suffix = (
         " To control which files are copied, define 'sourcecode' "
         "for the operation in a Guild file."
     )
 
+    def __init__(self, src_root, dest_root, select):
+        super().__init__(src_root, dest_root, select)
+        self._hash_cache = self.hash_cache or sourcecode_store.HashCache()
+        self._store = (
+            sourcecode_store.SourceCodeStore(hash_cache=self._hash_cache)
+            if sourcecode_store.enabled() else None
+        )
+        self._store_checked = False
+
+    def close(self):
+        if self._hash_cache is not self.hash_cache:
+            self._hash_cache.close()
+
+    def _copy_file(self, src, dest):
+        """Copies a source code file using the source code store.
+
+        Returns the file sha1.
+        """
+        if self._store and not self._store_checked:
+            self._check_store(os.path.dirname(dest))
+        if not self._store:
+            return self._copy_project_file(src, dest)
+        blob = self._store.add(src)
+        try:
+            self._store.materialize(blob, dest)
+        except FileNotFoundError:
+            # Blob removed by a concurrent store gc
+            return self._copy_project_file(src, dest)
+        return blob.sha1
+
+    def _copy_project_file(self, src, dest):
+        _sha256, sha1 = sourcecode_store.copy_file(src, dest, self._hash_cache)
+        return sha1
+
+    def _check_store(self, dest_dir):
+        self._store_checked = True
+        if not self._store.shares_files(dest_dir):
+            log.debug(
+                "source code files in %s can't share storage with %s, "
+                "copying files from project",
+                dest_dir,
+                self._store.path,
+            )
+            self._store = None
+
     def ignore(self, path, rule_results):
         fullpath = os.path.join(self.src_root, path)
         if self._default_rules_in_effect(rule_results):
@@ -1940,15 +2061,27 @@ def handle_system_exit(e):
     main.handle_system_exit(e)
 
 
-def sourcecode_manifest_logger_cls(run_dir):
+def sourcecode_manifest_logger_cls(run_dir, hash_cache=None):
     m = run_manifest.manifest_for_run(run_dir, "a")
+    shared_hash_cache = hash_cache
 
     class Handler(SourceCodeCopyHandler):
+        hash_cache = shared_hash_cache
+
         def _try_copy_file(self, src, dest):
-            super()._try_copy_file(src, dest)
-            m.write(run_manifest.sourcecode_args(dest, run_dir, src, self.src_root))
+            sha1 = super()._try_copy_file(src, dest)
+            m.write(
+                run_manifest.sourcecode_args(
+                    dest,
+                    run_dir,
+                    src,
+                    self.src_root,
+                    sha1=sha1,
+                )
+            )
 
         def close(self):
+            super().close()
             m.close()
 
     return Handler
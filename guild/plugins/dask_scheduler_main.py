@@ -27,7 +27,6 @@ logging.basicConfig(
     datefmt="%Y-%m-%d %H:%M:%S",
 )
 
-RUN_STATUS_LOCK_TIMEOUT = 30
 WAIT_FOR_RUNNING_DELAY = 5.0
 
 log = logging.getLogger("guild")
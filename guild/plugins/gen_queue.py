@@ -15,17 +15,19 @@
 import logging
 import os
 import signal
+import threading
 import time
 
-from guild import lock as locklib
 from guild import op_util
+from guild import run as runlib
+from guild import run_catalog
+from guild import run_watcher
 from guild import util
 from guild import var
 
 log = logging.getLogger("guild")
 
 DEFAULT_POLL_INTERVAL = 10
-DEFAULT_RUN_STATUS_LOCK_TIMEOUT = 30
 
 
 class StateBase:
@@ -43,8 +45,8 @@ class StateBase:
         run_once=False,
         wait_for_running=False,
         gpus=None,
+        resource_pool=None,
         poll_interval=DEFAULT_POLL_INTERVAL,
-        run_status_lock_timeout=DEFAULT_RUN_STATUS_LOCK_TIMEOUT,
     ):
         self.start_run_cb = start_run_cb
         self.is_queue_cb = is_queue_cb
@@ -58,15 +60,215 @@ class StateBase:
         self.run_once = run_once
         self.wait_for_running = wait_for_running
         self.gpus = gpus
+        self.resource_pool = resource_pool
         self.poll_interval = poll_interval
         self.run_id = os.environ["RUN_ID"]
         self._logged_gpu_mismatch = set()
+        self._logged_missing_resources = set()
         self.waiting = set()
         self.logged_waiting = False
-        self.run_status_lock = locklib.Lock(
-            locklib.RUN_STATUS, timeout=run_status_lock_timeout
-        )
         self.started = 0
+        self.poll_event = threading.Event()
+        self.runs_watcher = run_watcher.RunsWatcher(
+            var.runs_dir(), on_change=self.poll_event.set
+        )
+        self.staged_runs = StagedRuns(var.runs_dir(), self.runs_watcher)
+
+
+class StagedRuns:
+    """Staged runs under a runs directory.
+
+    Runs are read from the run catalog when first used. Subsequent
+    reads list the runs directory and read only runs that were added
+    or whose `.guild` directory changed.
+
+    If `watcher` is active, only runs reported as changed by the
+    watcher are read. Changed runs are read regardless of their
+    mtimes as attrs (e.g. tags) may be rewritten without changing
+    them.
+    """
+    def __init__(self, root, watcher=None):
+        self.root = root
+        self.watcher = watcher
+        self._runs = None
+
+    def staged(self):
+        changed = self.watcher.changed() if self.watcher else None
+        if self._runs is None:
+            self._init_runs()
+        elif changed is None:
+            self._update()
+        else:
+            self._update_changed(changed)
+        staged = [run for _mtimes, run, is_staged in self._runs.values() if is_staged]
+        return var.runs(base_runs=staged, sort=["timestamp"])
+
+    def _init_runs(self):
+        # Read mtimes before runs so that a run that changes while it's
+        # being read is re-read later.
+        mtimes = run_catalog.runs_mtimes(self.root)
+        self._runs = {
+            run.id: _staged_runs_entry(run, mtimes[run.id])
+            for run in var.runs(self.root, force_root=True) if run.id in mtimes
+        }
+
+    def _update(self):
+        runs = {}
+        for name in util.safe_listdir(self.root):
+            entry = self._read_entry(name)
+            if entry:
+                runs[name] = entry
+        self._runs = runs
+
+    def _update_changed(self, changed):
+        for name in changed:
+            entry = self._read_entry(name, force=True)
+            if entry:
+                self._runs[name] = entry
+            else:
+                self._runs.pop(name, None)
+
+    def _read_entry(self, name, force=False):
+        path = os.path.join(self.root, name)
+        mtimes = run_catalog.run_mtimes(path)
+        if mtimes is None:
+            return None
+        entry = self._runs.get(name)
+        if force or entry is None or entry[0] != mtimes:
+            if not os.path.exists(os.path.join(path, ".guild", "opref")):
+                return None
+            entry = _staged_runs_entry(runlib.Run(name, path), mtimes)
+        return entry
+
+
+def _staged_runs_entry(run, mtimes):
+    return mtimes, run, run.status == "staged"
+
+
+class ResourcePool:
+    """Resources used by runs started by a queue.
+
+    `limits` is a dict of resource names to amounts available to
+    runs. `gpus` is a list of GPU IDs available to runs.
+
+    Runs declare the resources they require using tags in the format
+    `queue:NAME=VAL ...`. The `gpu` resource is the number of GPUs
+    required by a run. A run that specifies GPU IDs using `--gpus`
+    requires those GPUs.
+    """
+    def __init__(self, limits=None, gpus=None):
+        self.limits = dict(limits or {})
+        self.gpus = gpus or []
+        if self.gpus:
+            self.limits.setdefault("gpu", len(self.gpus))
+        self._reserved = {}
+        self._lock = threading.Lock()
+
+    def missing(self, run):
+        """Returns names of required resources not defined for the pool."""
+        required, _run_gpus = run_resources(run)
+        return sorted(name for name in required if name not in self.limits)
+
+    def can_reserve(self, run):
+        with self._lock:
+            return self._assign(run) is not None
+
+    def reserve(self, run):
+        """Reserves resources for run.
+
+        Returns a list of GPU IDs assigned to the run or None if
+        resources aren't available.
+        """
+        with self._lock:
+            assigned = self._assign(run)
+            if assigned is None:
+                return None
+            self._reserved[run.id] = assigned
+            _required, gpus = assigned
+            return gpus
+
+    def release(self, run):
+        with self._lock:
+            self._reserved.pop(run.id, None)
+
+    def available(self):
+        available = dict(self.limits)
+        for required, _gpus in self._reserved.values():
+            for name, amount in required.items():
+                if name in available:
+                    available[name] -= amount
+        return available
+
+    def free_gpus(self):
+        reserved = set()
+        for _required, gpus in self._reserved.values():
+            reserved.update(gpus)
+        return [gpu for gpu in self.gpus if gpu not in reserved]
+
+    def _assign(self, run):
+        required, run_gpus = run_resources(run)
+        available = self.available()
+        for name, amount in required.items():
+            if amount > available.get(name, 0):
+                return None
+        gpus = self._assign_gpus(run_gpus, required.get("gpu"))
+        if gpus is None:
+            return None
+        return required, gpus
+
+    def _assign_gpus(self, run_gpus, gpu_count):
+        free_gpus = self.free_gpus()
+        if run_gpus:
+            return run_gpus if set(run_gpus) <= set(free_gpus) else None
+        if not gpu_count:
+            return []
+        if gpu_count > len(free_gpus):
+            return None
+        return free_gpus[:int(gpu_count)]
+
+
+def run_resources(run):
+    """Returns a tuple of required resources and GPU IDs for run."""
+    resources = {}
+    for tag in run.get("tags") or []:
+        if tag.startswith("queue:"):
+            resources.update(_decode_resources(tag[6:], run))
+    run_gpus = _split_gpus(_run_gpus(run))
+    if run_gpus:
+        resources["gpu"] = len(run_gpus)
+    return resources, run_gpus
+
+
+def _decode_resources(encoded, run):
+    flags, errors = op_util.parse_flag_assigns(util.shlex_split(encoded))
+    if errors:
+        log.warning(
+            "Ignoring invalid resources for run %s (%r): parts must be in "
+            "format NAME=NUMBER",
+            run.id,
+            encoded,
+        )
+    return {
+        name: val
+        for name, val in flags.items()
+        if isinstance(val, (int, float)) and not isinstance(val, bool)
+    }
+
+
+def decode_resource_limits(encoded):
+    """Returns a dict of resource limits for an encoded string."""
+    flags, errors = op_util.parse_flag_assigns(util.shlex_split(encoded or ""))
+    if errors:
+        raise ValueError(
+            f"invalid resources {encoded!r}: parts must be in format NAME=NUMBER"
+        )
+    return flags
+
+
+def _split_gpus(gpus):
+    if gpus is None:
+        return []
+    return [gpu.strip() for gpu in str(gpus).split(",") if gpu.strip()]
 
 
 def run(state):
@@ -110,12 +312,38 @@ def _run_once(state):
 
 
 def _poll(state):
-    util.loop(lambda: _run_staged(state), time.sleep, state.poll_interval, 0)
+    _start_runs_watcher(state)
+    try:
+        util.loop(
+            lambda: _run_staged(state),
+            lambda timeout: _wait_for_poll(state, timeout),
+            state.poll_interval,
+            0,
+        )
+    finally:
+        state.runs_watcher.stop()
+
+
+def _start_runs_watcher(state):
+    if state.runs_watcher.start():
+        log.debug("watching %s for staged runs", state.runs_watcher.root)
+    else:
+        log.debug("polling for staged runs every %s second(s)", state.poll_interval)
+
+
+def _wait_for_poll(state, timeout):
+    """Waits for the next poll.
+
+    Waits for `timeout` seconds or until `state.poll_event` is set. The
+    event is set when the runs watcher detects a change.
+    """
+    state.poll_event.wait(timeout)
+    state.poll_event.clear()
 
 
 def _run_staged(state):
     while True:
-        runs = _safe_next_runs(state)
+        runs = _next_runs(state)
         if not runs:
             break
         _start_runs(runs, state)
@@ -123,45 +351,39 @@ def _run_staged(state):
         _log_waiting(state)
 
 
-def _safe_next_runs(state):
-    """Uses a system wide lock to get the next runs."""
-    try:
-        state.run_status_lock.acquire()
-    except locklib.Timeout as e:
-        log.warning(
-            "could not acquire lock for reading staged runs\n"
-            "If this error persists, try stopping all queues and "
-            "deleting %s",
-            e.lock_file,
-        )
-        return []
-    else:
-        # Must only be called when we have a lock.
-        return _unsafe_next_runs(state)
-    finally:
-        state.run_status_lock.release()
-
-
-def _unsafe_next_runs(state):
+def _next_runs(state):
     """Returns the next runs for the queue.
 
-    Note that this call is NOT safe across multiple queue
-    instances. Use `safe_next_run` to ensure that multiple queues use
-    proper locking.
+    Runs are claimed using `op_util.claim_staged_run`, which changes
+    their status to pending. A run that's claimed by another queue is
+    skipped.
     """
     blocking = _blocking_runs(state)
-    staged = _staged_runs()
+    staged = state.staged_runs.staged()
     _sync_state_for_blocking(blocking, state)
     _sync_state_for_staged(staged, state)
     if state.sync_state_cb:
         state.sync_state_cb(state, blocking=blocking, staged=staged)
     startable_runs = [run for run in staged if _can_start(run, blocking, state)]
-    next_runs = _limit_startable_runs(startable_runs, state)
-    for run in next_runs:
-        # Setting run to PENDING takes it out of the running for
-        # other queues to start.
-        op_util.set_run_pending(run)
-    return next_runs
+    return _claim_startable_runs(startable_runs, state)
+
+
+def _claim_startable_runs(runs, state):
+    claimed = []
+    for run in runs:
+        if _startable_runs_limit_reached(claimed, state):
+            break
+        if op_util.claim_staged_run(run):
+            claimed.append(run)
+        else:
+            log.debug("staged run %s claimed by another process", run.id)
+    return claimed
+
+
+def _startable_runs_limit_reached(runs, state):
+    return (
+        state.max_startable_runs is not None and len(runs) >= state.max_startable_runs
+    )
 
 
 def _blocking_runs(state):
@@ -175,12 +397,6 @@ def _is_queue_or_self(run, state):
     return run.id == state.run_id or state.is_queue_cb(run)
 
 
-def _staged_runs():
-    return var.runs(
-        sort=["timestamp"], filter=var.run_filter("attr", "status", "staged")
-    )
-
-
 def _sync_state_for_blocking(blocking, state):
     waiting_count_before_sync = len(state.waiting)
     state.waiting.intersection_update(_run_ids(blocking))
@@ -192,6 +408,7 @@ def _sync_state_for_blocking(blocking, state):
 
 def _sync_state_for_staged(staged, state):
     state._logged_gpu_mismatch.intersection_update(_run_ids(staged))
+    state._logged_missing_resources.intersection_update(_run_ids(staged))
     if state._logged_gpu_mismatch:
         log.debug("gpu mismatch: %s", state._logged_gpu_mismatch)
 
@@ -204,6 +421,7 @@ def _can_start(run, blocking, state):
     return util.find_apply(
         [
             lambda: _check_gpu_mismatch(run, state),
+            lambda: _check_missing_resources(run, state),
             lambda: _check_blocking(run, blocking, state),
             lambda: _check_state_can_start(run, state),
             lambda: True,
@@ -223,7 +441,14 @@ def _gpu_mismatch(run, state):
     if not state.gpus:
         return None
     run_gpus = _run_gpus(run)
-    if run_gpus and run_gpus != state.gpus:
+    if not run_gpus:
+        return None
+    if state.resource_pool:
+        # Queue starts runs on any of its GPUs.
+        if set(_split_gpus(run_gpus)) <= set(state.resource_pool.gpus):
+            return None
+        return run_gpus
+    if run_gpus != state.gpus:
         return run_gpus
     return None
 
@@ -244,6 +469,27 @@ def _handle_gpu_mismatch(run, run_gpus, state):
         state._logged_gpu_mismatch.add(run.id)
 
 
+def _check_missing_resources(run, state):
+    if not state.resource_pool:
+        return None
+    missing = state.resource_pool.missing(run)
+    if missing:
+        _handle_missing_resources(run, missing, state)
+        return False
+    return None
+
+
+def _handle_missing_resources(run, missing, state):
+    if run.id not in state._logged_missing_resources:
+        log.info(
+            "Ignorning staged run %s (requires resources not defined for %s: %s)",
+            run.id,
+            state.name,
+            ", ".join(missing),
+        )
+        state._logged_missing_resources.add(run.id)
+
+
 def _check_blocking(run, blocking, state):
     if blocking:
         _handle_blocking(run, blocking, state)
@@ -272,10 +518,6 @@ def _check_state_can_start(run, state):
     return state.can_start_cb(run, state)
 
 
-def _limit_startable_runs(runs, state):
-    return runs[0:state.max_startable_runs]
-
-
 def _start_runs(runs, state):
     for run in runs:
         try:
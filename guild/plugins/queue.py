@@ -37,6 +37,17 @@ list of GPU IDs. This value is used when starting staged runs. For \
 example, to support parallel runs on all available GPUs, start one \
 queue for each GPU ID. Staged runs would then be assigned to a GPU \
 according to the queue that starts it.
+
+To run more than one staged run at a time, set `workers` to the \
+maximum number of concurrent runs. Use `resources` to limit runs by \
+the resources they require. Resources are specified as \
+`NAME=AMOUNT` pairs separated by spaces, for example `cpu=8 \
+memory=32`. Runs declare required resources using a tag in the format \
+`queue:NAME=AMOUNT ...`, for example `--tag 'queue:cpu=2 memory=4'`. \
+When `gpus` is specified, a run that requires `gpu=N` is assigned N of \
+the queue GPUs that are not in use. Runs that don't require GPUs are \
+started without GPUs. A queue does not start runs that require \
+resources it doesn't define.
 """
 
 queue_flags_data = yaml.safe_load(
@@ -62,6 +73,18 @@ gpus:
     If this flag is specified and a staged run has a different value for
     gpus, the queue will not run it.
   null-label: unspecified
+workers:
+  description: Maximum number of staged runs to run at a time
+  type: int
+  null-label: 1
+resources:
+  description: >
+    Resources available to runs in the format 'NAME=AMOUNT ...'
+
+    Runs declare required resources using a tag in the format
+    'queue:NAME=AMOUNT ...'. The queue starts a run when its required
+    resources are available.
+  null-label: unspecified
 """
 )
 
@@ -14,6 +14,9 @@
 
 import argparse
 import logging
+import threading
+
+from concurrent import futures
 
 from guild import _api as gapi
 from guild import util
@@ -42,19 +45,62 @@ class State(gen_queue.StateBase):
         )
 
 
+class PoolState(gen_queue.StateBase):
+    """State for a queue that runs staged runs in a pool of workers."""
+    def __init__(self, args):
+        super().__init__(
+            start_run_cb=_submit_run,
+            is_queue_cb=_is_queue,
+            can_start_cb=_can_submit_run,
+            wait_for_running_cb=_wait_for_submitted_runs,
+            cleanup_cb=_shutdown_pool,
+            max_startable_runs=1,
+            poll_interval=args.poll_interval,
+            run_once=args.run_once,
+            wait_for_running=args.wait_for_running,
+            gpus=args.gpus,
+            resource_pool=gen_queue.ResourcePool(
+                _resource_limits(args), _split_gpus(args.gpus)
+            ),
+        )
+        self.workers = args.workers or 1
+        self.executor = futures.ThreadPoolExecutor(max_workers=self.workers)
+        self.running = {}
+        self.running_lock = threading.Lock()
+
+
+def _resource_limits(args):
+    try:
+        return gen_queue.decode_resource_limits(args.resources)
+    except ValueError as e:
+        raise SystemExit(f"queue: {e}") from None
+
+
+def _split_gpus(gpus):
+    return [gpu.strip() for gpu in (gpus or "").split(",") if gpu.strip()]
+
+
 def main():
     args = _parse_args()
-    state = State(args)
+    state = _init_state(args)
     gen_queue.simulate_batch()
     gen_queue.run(state)
 
 
+def _init_state(args):
+    if (args.workers or 1) > 1 or args.resources:
+        return PoolState(args)
+    return State(args)
+
+
 def _parse_args():
     p = argparse.ArgumentParser()
     p.add_argument("--poll-interval", type=int, default=10)
     p.add_argument("--run-once", action="store_true")
     p.add_argument("--wait-for-running", action="store_true")
     p.add_argument("--gpus")
+    p.add_argument("--workers", type=int)
+    p.add_argument("--resources")
     return p.parse_args()
 
 
@@ -66,6 +112,67 @@ def _start_run(run, state):
         raise RuntimeError(f"{run.id} failed with exit code {e.returncode}") from e
 
 
+def _can_submit_run(run, state):
+    with state.running_lock:
+        if len(state.running) >= state.workers:
+            return False
+    if not state.resource_pool.can_reserve(run):
+        return False
+    return None
+
+
+def _submit_run(run, state):
+    # Resources are only reserved here, after `_can_submit_run`
+    # confirms they're available, so reserve always succeeds.
+    gpus = state.resource_pool.reserve(run)
+    assert gpus is not None, run.id
+    with state.running_lock:
+        future = state.executor.submit(_start_pool_run, run, gpus, state)
+        state.running[future] = run
+    future.add_done_callback(lambda f: _pool_run_done(f, state))
+
+
+def _start_pool_run(run, gpus, state):
+    if gpus:
+        log.info("Starting staged run %s (GPUs %s)", run.id, ",".join(gpus))
+    else:
+        log.info("Starting staged run %s", run.id)
+    try:
+        gapi.run(
+            restart=run.id,
+            extra_env=_run_env(run),
+            gpus=",".join(gpus) if gpus else None,
+            no_gpus=bool(state.resource_pool.gpus and not gpus),
+        )
+    except gapi.RunError as e:
+        raise RuntimeError(f"{run.id} failed with exit code {e.returncode}") from e
+
+
+def _pool_run_done(future, state):
+    with state.running_lock:
+        run = state.running.pop(future)
+    state.resource_pool.release(run)
+    try:
+        future.result()
+    except Exception as e:
+        log.error("%s", e)
+    # Wake the queue to start runs using the released resources.
+    state.poll_event.set()
+
+
+def _wait_for_submitted_runs(state):
+    while True:
+        with state.running_lock:
+            running = list(state.running)
+        if not running:
+            break
+        futures.wait(running)
+
+
+def _shutdown_pool(state):
+    state.executor.shutdown(wait=False)
+
+
 def _run_env(run):
     return {
         "NO_RESTARTING_MSG": "1",
@@ -26,7 +26,9 @@ log = logging.getLogger("guild")
 def main():
     batch_util.init_logging()
     batch_run = batch_util.batch_run()
-    skopt_util.handle_seq_trials(batch_run, _suggest_x)
+    skopt_util.handle_seq_trials(
+        batch_run, skopt_util.PersistentOptimizer(_init_optimizer, _suggest_x)
+    )
 
 
 def _suggest_x(dims, x0, y0, random_start, random_state, opts):
@@ -44,6 +46,22 @@ def _suggest_x(dims, x0, y0, random_start, random_state, opts):
     return res.x_iters[-1], res.random_state
 
 
+def _init_optimizer(dims, random_state, opts):
+    return skopt.Optimizer(
+        dims,
+        "ET",
+        n_initial_points=0,
+        acq_func="EI",
+        acq_optimizer="sampling",
+        random_state=random_state,
+        model_queue_size=1,
+        acq_func_kwargs={
+            "kappa": opts["kappa"],
+            "xi": opts["xi"],
+        },
+    )
+
+
 def gen_trials(
     flags, prev_results_cb, opt_random_starts=3, opt_kappa=1.96, opt_xi=0.01, **kw
 ):
@@ -24,7 +24,9 @@ log = logging.getLogger("guild")
 def main():
     batch_util.init_logging()
     batch_run = batch_util.batch_run()
-    skopt_util.handle_seq_trials(batch_run, _suggest_x)
+    skopt_util.handle_seq_trials(
+        batch_run, skopt_util.PersistentOptimizer(_init_optimizer, _suggest_x)
+    )
 
 
 def _suggest_x(dims, x0, y0, random_start, random_state, opts):
@@ -44,6 +46,17 @@ def _suggest_x(dims, x0, y0, random_start, random_state, opts):
     return res.x_iters[-1], res.random_state
 
 
+def _init_optimizer(dims, random_state, opts):
+    return skopt_util.patched_gp_optimizer(
+        dims,
+        random_state=random_state,
+        acq_func=opts["acq-func"],
+        kappa=opts["kappa"],
+        xi=opts["xi"],
+        noise=opts["noise"],
+    )
+
+
 def gen_trials(
     flags,
     prev_results_cb,
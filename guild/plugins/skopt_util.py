@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
+import copy
 import logging
 import os
 import typing
@@ -218,9 +220,23 @@ def _run_seq_trials(batch_run, suggest_x_cb):
     prev_trials_model = (
         batch_flag_vals.get("prev-trials") or batch_util.PREV_TRIALS_BATCH
     )
-    prev_trials_cb = lambda: batch_util.trial_results(
-        batch_run, [objective_scalar], prev_trials_model
-    )
+    prev_trials_cb = _prev_trials_cb(batch_run, objective_scalar, prev_trials_model)
+    max_parallel = batch_util.max_parallel(batch_run)
+    if max_parallel > 1:
+        _run_parallel_trials(
+            batch_run,
+            proto_flag_vals,
+            objective_scalar,
+            objective_negate,
+            max_trials,
+            max_parallel,
+            random_state,
+            random_starts,
+            prev_trials_cb,
+            suggest_x_cb,
+            batch_flag_vals,
+        )
+        return
     trials_count = 0
     for trial_flag_vals, is_trial_random_start, prev_trials, x0 in _iter_seq_trials(
         proto_flag_vals,
@@ -249,6 +265,102 @@ def _run_seq_trials(batch_run, suggest_x_cb):
             trials_count += 1
 
 
+def _prev_trials_cb(batch_run, objective_scalar, prev_trials_mode):
+    """Returns a callback that returns previous trial results.
+
+    The callback accepts an optional list of runs to exclude from
+    results.
+    """
+    def f(exclude_runs=None):
+        runs = batch_util.trial_runs(batch_run, prev_trials_mode)
+        if exclude_runs:
+            exclude_ids = {run.id for run in exclude_runs}
+            runs = [run for run in runs if run.id not in exclude_ids]
+        return batch_util.trial_results_for_runs(runs, [objective_scalar])
+
+    return f
+
+
+def _run_parallel_trials(
+    batch_run,
+    proto_flag_vals,
+    objective_scalar,
+    objective_negate,
+    max_trials,
+    max_parallel,
+    random_state,
+    random_starts,
+    prev_trials_cb,
+    suggest_x_cb,
+    suggest_x_opts,
+):
+    """Runs up to `max_parallel` optimizer trials at a time.
+
+    Suggestions are made while trials are running using a constant
+    liar strategy: each running trial is added to the previous trials
+    with the best objective observed so far. Results are used for
+    subsequent suggestions as trials finish.
+    """
+    running_trials = []
+    found_trials = []
+
+    def prev_trials_with_lies():
+        # Running trials are represented only by lies. Results for a
+        # running trial (e.g. intermediate objective values) aren't
+        # used until the trial is finished.
+        prev_trials = prev_trials_cb(running_trials)
+        found_trials[:] = prev_trials
+        return prev_trials + _running_trial_lies(
+            running_trials, prev_trials, objective_negate
+        )
+
+    trials = _iter_seq_trials(
+        proto_flag_vals,
+        objective_negate,
+        max_trials,
+        random_state,
+        random_starts,
+        prev_trials_with_lies,
+        suggest_x_cb,
+        suggest_x_opts,
+    )
+    trials_count = 0
+
+    def next_trial(running):
+        nonlocal trials_count
+        running_trials[:] = running
+        try:
+            trial_flag_vals, is_trial_random_start, _, x0 = next(trials)
+        except StopIteration:
+            return None
+        _log_seq_trial(
+            is_trial_random_start,
+            random_starts,
+            trials_count,
+            x0,
+            found_trials,
+            objective_scalar,
+        )
+        trials_count += 1
+        return batch_util.init_trial_run(batch_run, trial_flag_vals)
+
+    batch_util.run_trials_parallel(batch_run, next_trial, max_parallel)
+
+
+def _running_trial_lies(running_trials, prev_trials, objective_negate):
+    """Returns previous trial results for running trials.
+
+    Running trials are assigned the best objective value found in
+    `prev_trials`. If there are no objective values, returns an empty
+    list.
+    """
+    ys = [y_scalars[0] for _flags, y_scalars in prev_trials if y_scalars[0] is not None]
+    if not ys:
+        return []
+    lie = min(ys) if objective_negate == 1 else max(ys)
+    return [(run.get("flags"), [lie]) for run in running_trials]
+
+
 def _iter_seq_trials(
     proto_flag_vals,
     objective_negate,
@@ -386,6 +498,141 @@ def _trial_flags_for_x(x, names, proto_flag_vals):
     return flags
 
 
+###################################################################
+# Persistent optimizer
+###################################################################
+
+
+class PersistentOptimizer:
+    """Suggests x using an optimizer that persists across trials.
+
+    `init_optimizer_cb` is called with dims, random state, and opts and
+    must return a `skopt.Optimizer`. For each suggestion, only
+    observations in x0 and y0 that haven't been told to the optimizer
+    are told to it. If observations that were told are no longer in x0
+    and y0 (e.g. a run was deleted or a result for a running trial was
+    replaced), the optimizer is recreated.
+
+    If there are no new observations for a suggestion (e.g. the trial
+    for the last suggestion failed), the worst observed result for the
+    last suggested x is saved as a lie so that x isn't suggested
+    again. Lies are never told to the persistent optimizer. They're
+    told to a copy of the optimizer, which is used to suggest x. A lie
+    is dropped when x is observed.
+
+    Random starts are suggested using `suggest_x_cb`.
+
+    Instances may be used as `suggest_x_cb` for `handle_seq_trials`.
+    """
+    def __init__(self, init_optimizer_cb, suggest_x_cb):
+        self._init_optimizer = init_optimizer_cb
+        self._suggest_x = suggest_x_cb
+        self._optimizer = None
+        self._told = collections.Counter()
+        self._lies = []
+        self._last_x = None
+
+    def __call__(self, dims, x0, y0, random_start, random_state, opts):
+        if random_start:
+            return self._suggest_x(dims, x0, y0, random_start, random_state, opts)
+        observations = [(tuple(x), y) for x, y in zip(x0, y0)]
+        if self._optimizer is None or self._told - collections.Counter(observations):
+            self._optimizer = self._init_optimizer(dims, random_state, opts)
+            self._told = collections.Counter()
+            self._lies = []
+            self._last_x = None
+        new_observations = _new_observations(observations, self._told)
+        if new_observations:
+            _tell(self._optimizer, new_observations)
+            _warm_start_estimator(self._optimizer)
+            self._told.update(new_observations)
+        elif self._last_x is not None and y0:
+            # Optimizer otherwise suggests the last x again.
+            self._lies.append((tuple(self._last_x), max(y0)))
+        observed = {x for x, _y in observations}
+        self._lies = [lie for lie in self._lies if lie[0] not in observed]
+        self._last_x = self._ask()
+        return self._last_x, self._optimizer.rng
+
+    def _ask(self):
+        """Returns suggested x.
+
+        If there are lies, x is suggested by a copy of the optimizer
+        that's told the lies. If the copy suggests x that it's been
+        told, returns a random x.
+        """
+        if not self._lies:
+            return _ask(self._optimizer)
+        optimizer = _lied_optimizer(self._optimizer, self._lies)
+        x = _ask(optimizer)
+        if _is_told(optimizer, x):
+            log.debug("optimizer suggested told x %s, using random x", x)
+            return optimizer.space.rvs(random_state=optimizer.rng)[0]
+        return x
+
+
+def _tell(optimizer, observations):
+    xs = [list(x) for x, _y in observations]
+    ys = [y for _x, y in observations]
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", category=Warning)
+        optimizer.tell(xs, ys)
+
+
+def _ask(optimizer):
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", category=Warning)
+        return optimizer.ask()
+
+
+def _lied_optimizer(optimizer, lies):
+    """Returns a copy of optimizer that's been told lies.
+
+    The copy shares the optimizer's estimator and random state but
+    not its observations or models. Unlike `Optimizer.copy()`, the
+    copy fits a model once, after it's told the lies.
+    """
+    lied = copy.copy(optimizer)
+    lied.Xi = list(optimizer.Xi)
+    lied.yi = list(optimizer.yi)
+    lied.models = list(optimizer.models)
+    if hasattr(optimizer, "gains_"):
+        lied.gains_ = optimizer.gains_.copy()
+    _tell(lied, lies)
+    return lied
+
+
+def _is_told(optimizer, x):
+    return any(optimizer.space.distance(x, xi) <= 1e-8 for xi in optimizer.Xi)
+
+
+def _new_observations(observations, told):
+    told = collections.Counter(told)
+    new = []
+    for observation in observations:
+        if told[observation] > 0:
+            told[observation] -= 1
+        else:
+            new.append(observation)
+    return new
+
+
+def _warm_start_estimator(optimizer):
+    """Uses the hyperparameters of the last fitted GP to fit the next.
+
+    Only applies to GP estimators. Fitting the next model still uses
+    the estimator's optimizer restarts.
+    """
+    model = optimizer.models[-1] if optimizer.models else None
+    kernel = getattr(model, "kernel_", None)
+    if kernel is None:
+        return
+    if model.noise:
+        # Fitted kernel includes white noise added by the model
+        kernel = kernel.k1
+    optimizer.base_estimator_.set_params(kernel=kernel)
+
+
 ###################################################################
 # Sequential trials ipy support
 ###################################################################
@@ -562,6 +809,45 @@ def patched_gp_minimize(
         )
 
 
+def patched_gp_optimizer(
+    dimensions,
+    random_state=None,
+    acq_func="gp_hedge",
+    acq_optimizer="auto",
+    n_points=10000,
+    n_restarts_optimizer=5,
+    xi=0.01,
+    kappa=1.96,
+    noise="gaussian",
+):
+    """Returns a `skopt.Optimizer` configured as `patched_gp_minimize`.
+
+    The optimizer keeps only its most recent model.
+    """
+    from sklearn.utils import check_random_state
+    from guild._skopt.utils import normalize_dimensions
+
+    rng = check_random_state(random_state)
+    base_estimator = _patched_gp_base_estimator(dimensions, rng, noise)
+    return skopt.Optimizer(
+        normalize_dimensions(dimensions),
+        base_estimator,
+        n_initial_points=0,
+        acq_func=acq_func,
+        acq_optimizer=acq_optimizer,
+        random_state=rng,
+        model_queue_size=1,
+        acq_optimizer_kwargs={
+            "n_points": n_points,
+            "n_restarts_optimizer": n_restarts_optimizer,
+        },
+        acq_func_kwargs={
+            "xi": xi,
+            "kappa": kappa,
+        },
+    )
+
+
 def _patched_gp_base_estimator(dimensions, random_state, noise):
     """Returns a GP non-y-normalizing GP estimator."""
     import numpy as np
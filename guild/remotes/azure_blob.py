@@ -16,7 +16,6 @@ import logging
 import os
 import subprocess
 import sys
-import uuid
 
 from guild import remote as remotelib
 from guild import remote_util
@@ -30,6 +29,9 @@ log = logging.getLogger("guild.remotes.azure_blob")
 RUNS_PATH = ["runs"]
 DELETED_RUNS_PATH = ["trash", "runs"]
 
+# Max number of paths to remove with a single azcopy command.
+MAX_REMOVE_PATHS = 100
+
 
 class AzureBlobStorageRemoteType(remotelib.RemoteType):
     def __init__(self, _ep):
@@ -60,10 +62,24 @@ class AzureBlobStorageRemote(meta_sync.MetaSyncRemote):
 
     def _sync_runs_meta(self, force=False):
         remote_util.remote_activity(f"Refreshing run info for {self.name}")
-        if not force and meta_sync.meta_current(
-            self.local_sync_dir, self._remote_meta_id
-        ):
+        local_meta_id = meta_sync.local_meta_id(self.local_sync_dir)
+        if local_meta_id is None:
+            self._sync_all_runs_meta()
+            return
+        remote_meta_id = self._remote_meta_id()
+        if not force and local_meta_id == remote_meta_id:
             return
+        if not meta_sync.sync_changed_meta(
+            self.local_sync_dir,
+            remote_meta_id,
+            self._sync_changes,
+            self._sync_paths,
+        ):
+            self._sync_all_runs_meta()
+        if force:
+            self._prune_changes()
+
+    def _sync_all_runs_meta(self):
         _ensure_azure_local_dir(self.local_sync_dir)
         meta_sync.clear_local_meta_id(self.local_sync_dir)
         # TODO: This is a terribly ineffecient approach as we're
@@ -80,6 +96,44 @@ class AzureBlobStorageRemote(meta_sync.MetaSyncRemote):
             "true",
         ]
         self._azcopy("sync", sync_args, quiet=True)
+        meta_sync.init_local_changes(self.local_sync_dir)
+
+    def _sync_changes(self, _start_after=None):
+        # azcopy can't list blobs after a key so the change log is
+        # synced in full. Pruning (see `_prune_changes`) keeps the
+        # change log within the retention horizon.
+        self._sync_path(meta_sync.CHANGES_PATH)
+
+    def _prune_changes(self):
+        """Removes changes that are prunable for the local meta ID.
+
+        Changes are removed from both the remote and the local change
+        log so that they aren't synced again.
+        """
+        meta_id = meta_sync.local_meta_id(self.local_sync_dir)
+        changes_dir = os.path.join(self.local_sync_dir, meta_sync.CHANGES_PATH)
+        if meta_id is None or not os.path.isdir(changes_dir):
+            return
+        prunable = meta_sync.prunable_changes(os.listdir(changes_dir), meta_id)
+        for i in range(0, len(prunable), MAX_REMOVE_PATHS):
+            args = [
+                self._container_path(meta_sync.CHANGES_PATH),
+                "--recursive",
+                "--include-path",
+                ";".join(prunable[i:i + MAX_REMOVE_PATHS]),
+            ]
+            self._azcopy("remove", args, quiet=True)
+        meta_sync.prune_old_local_changes(self.local_sync_dir, meta_id)
+
+    def _sync_paths(self, paths):
+        for path in paths:
+            self._sync_path(path)
+
+    def _sync_path(self, path):
+        local_path = os.path.join(self.local_sync_dir, *path.split("/"))
+        _ensure_azure_local_dir(local_path)
+        sync_args = [self._container_path(*path.split("/")), local_path]
+        self._azcopy("sync", sync_args, quiet=True)
 
     def _remote_meta_id(self):
         with util.TempFile("guild-azure-blob-") as tmp:
@@ -108,7 +162,10 @@ class AzureBlobStorageRemote(meta_sync.MetaSyncRemote):
                 # this out for now.
                 self._azcopy("copy", [run_path, deleted_path, "--recursive"])
                 self._azcopy("remove", [run_path, "--recursive"])
-        self._new_meta_id()
+        self._new_meta_id(
+            added=[] if permanent else _run_paths(runs, DELETED_RUNS_PATH),
+            removed=_run_paths(runs, RUNS_PATH),
+        )
 
     def _restore_runs(self, runs):
         for run in runs:
@@ -117,13 +174,16 @@ class AzureBlobStorageRemote(meta_sync.MetaSyncRemote):
             # TODO: See _delete_runs above. Same problem applies here.
             self._azcopy("copy", [deleted_path, restored_path, "--recursive"])
             self._azcopy("remove", [deleted_path, "--recursive"])
-        self._new_meta_id()
+        self._new_meta_id(
+            added=_run_paths(runs, RUNS_PATH),
+            removed=_run_paths(runs, DELETED_RUNS_PATH),
+        )
 
     def _purge_runs(self, runs):
         for run in runs:
             path = self._container_path(*(DELETED_RUNS_PATH + [run.id]))
-            self._azsync("remove", [path, "--recursive"])
-        self._new_meta_id()
+            self._azcopy("remove", [path, "--recursive"])
+        self._new_meta_id(removed=_run_paths(runs, DELETED_RUNS_PATH))
 
     def status(self, verbose=False):
         path = self._container_path()
@@ -145,7 +205,7 @@ class AzureBlobStorageRemote(meta_sync.MetaSyncRemote):
     def push(self, runs, delete=False):
         for run in runs:
             self._push_run(run, delete)
-            self._new_meta_id()
+        self._new_meta_id(added=_run_paths(runs, RUNS_PATH))
         self._sync_runs_meta(force=True)
 
     def _push_run(self, run, delete):
@@ -157,13 +217,19 @@ class AzureBlobStorageRemote(meta_sync.MetaSyncRemote):
         log.info("Copying %s to %s", run.id, self.name)
         self._azcopy("sync", args)
 
-    def _new_meta_id(self):
-        meta_id = uuid.uuid4().hex
+    def _new_meta_id(self, added=None, removed=None):
+        """Writes a change for added and removed paths.
+
+        The remote meta ID is set to the change ID.
+        """
+        change_id = meta_sync.new_change_id()
         with util.TempFile("guild-azure-blob-") as tmp:
+            meta_sync.write_change(tmp.path, added, removed)
+            change_path = self._container_path(meta_sync.CHANGES_PATH, change_id)
+            self._azcopy("copy", [tmp.path, change_path])
             with open(tmp.path, "w") as f:
-                f.write(meta_id)
-            args = [tmp.path, self._container_path("meta-id")]
-            self._azcopy("copy", args)
+                f.write(change_id)
+            self._azcopy("copy", [tmp.path, self._container_path("meta-id")])
 
     def pull(self, runs, delete=False):
         for run in runs:
@@ -191,6 +257,10 @@ def _azcopy_cmd():
     return cmd
 
 
+def _run_paths(runs, base_path):
+    return ["/".join(base_path + [run.id]) for run in runs]
+
+
 def _ensure_azure_local_dir(dir):
     """Creates dir if it doesn't exist.
 
@@ -12,10 +12,51 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+"""Support for remotes that sync run metadata to a local directory.
+
+Remotes maintain a `meta-id` that changes whenever remote runs change.
+Local metadata is synced when the local meta ID differs from the
+remote meta ID.
+
+Remotes may also maintain an append-only change log under `changes`.
+Each change is a file named by its change ID that lists the remote
+paths added or removed by the change (see `write_change`). When a
+remote writes a change it sets the meta ID to the change ID. Local
+metadata is then synced by applying changes that are new since the
+last sync rather than syncing metadata for all runs (see
+`sync_changed_meta`).
+
+Remotes may also maintain a meta bundle, a single compressed file
+that contains the metadata for all remote runs as of a meta ID (see
+`write_meta_bundle`). When local metadata must be synced for all runs,
+the bundle is downloaded and unpacked rather than syncing metadata
+files for each run (see `unpack_meta_bundle`). Changes made after the
+bundle meta ID are then applied from the change log.
+
+Writing a bundle reads metadata for all runs, so bundles aren't
+rewritten for each change. A remote rewrites the bundle after it
+changes the remote when more than `META_BUNDLE_CHANGED_PATHS` paths
+have changed since the last bundle it wrote or unpacked, or when that
+bundle precedes the change log retention horizon (see
+`meta_bundle_due`). This keeps the number of changes applied after
+unpacking a bundle below `MAX_CHANGED_PATHS`.
+
+Change logs are pruned so they don't grow without bound. Changes made
+more than `CHANGE_LOG_RETENTION` seconds before a meta bundle are
+removed from the remote (see `prunable_changes`). Changes are pruned
+when a bundle is written, so changes made after the latest bundle are
+never pruned. Local metadata that is older than the retention horizon
+is synced for all runs rather than by applying changes.
+"""
+
+import gzip
 import hashlib
+import json
 import logging
 import os
 import re
+import time
+import uuid
 
 from guild import click_util
 from guild import cmd_impl_support
@@ -27,6 +68,28 @@ from guild.commands import runs_impl
 
 log = logging.getLogger("guild")
 
+CHANGES_PATH = "changes"
+
+# If more than this many paths change since the last sync, metadata
+# for all runs is synced.
+MAX_CHANGED_PATHS = 100
+
+META_BUNDLE_NAME = "runs-meta.jsonl.gz"
+
+# Meta bundles are rewritten when more than this many paths change
+# since the last bundle.
+META_BUNDLE_CHANGED_PATHS = MAX_CHANGED_PATHS // 2
+
+LOCAL_META_BUNDLE_ID = "meta-bundle-id"
+
+# Changes made this many seconds before the latest meta bundle may be
+# pruned from a remote change log.
+CHANGE_LOG_RETENTION = 7 * 24 * 60 * 60
+
+# Changes are listed starting this many seconds before the latest
+# synced change to allow for clock differences between writers.
+CHANGE_ID_SKEW = 5 * 60
+
 
 class MetaSyncRemote(remotelib.Remote):
     def __init__(self, runs_dir, deleted_runs_dir=None):
@@ -215,6 +278,17 @@ def write_local_meta_id(meta_id, local_sync_dir):
         f.write(meta_id)
 
 
+def local_meta_bundle_id(local_sync_dir):
+    id_path = os.path.join(local_sync_dir, LOCAL_META_BUNDLE_ID)
+    return util.try_read(id_path, apply=str.strip)
+
+
+def write_local_meta_bundle_id(meta_id, local_sync_dir):
+    id_path = os.path.join(local_sync_dir, LOCAL_META_BUNDLE_ID)
+    with open(id_path, "w") as f:
+        f.write(meta_id)
+
+
 def meta_current(local_sync_dir, remote_meta_id_cb):
     local_id = local_meta_id(local_sync_dir)
     if local_id is None:
@@ -233,3 +307,287 @@ def is_meta_file(name):
         "/.guild/attrs/" in name  #
         or "/.guild/LOCK" in name
     )
+
+
+def new_change_id():
+    """Returns a new change ID.
+
+    Change IDs sort by the time they're generated.
+    """
+    return f"{time.time_ns():020d}-{uuid.uuid4().hex}"
+
+
+def _change_time_ns(change_id):
+    try:
+        return int(change_id.split("-", 1)[0])
+    except (AttributeError, ValueError):
+        return None
+
+
+def changes_start_after(change_ids):
+    """Returns the key after which to list changes following change_ids.
+
+    Remotes that can list keys in order use this to list only changes
+    that may not be synced. The key precedes the latest change by
+    `CHANGE_ID_SKEW`. Returns None if change_ids doesn't contain a
+    change ID, in which case all changes must be listed.
+    """
+    times = [t for t in map(_change_time_ns, change_ids) if t is not None]
+    if not times:
+        return None
+    return f"{max(max(times) - CHANGE_ID_SKEW * 10**9, 0):020d}"
+
+
+def prunable_changes(change_ids, meta_id):
+    """Returns the changes in change_ids that are prunable for meta_id.
+
+    Changes made more than `CHANGE_LOG_RETENTION` seconds before
+    meta_id are prunable. Returns an empty list if meta_id isn't a
+    change ID.
+    """
+    meta_time = _change_time_ns(meta_id)
+    if meta_time is None:
+        return []
+    cutoff = meta_time - CHANGE_LOG_RETENTION * 10**9
+    prunable = []
+    for change_id in change_ids:
+        change_time = _change_time_ns(change_id)
+        if change_time is not None and change_time < cutoff:
+            prunable.append(change_id)
+    return prunable
+
+
+def _retained_since(local_id, meta_id):
+    """Returns False if changes since local_id may have been pruned."""
+    local_time, meta_time = _change_time_ns(local_id), _change_time_ns(meta_id)
+    if local_time is None or meta_time is None:
+        return True
+    return local_time >= meta_time - CHANGE_LOG_RETENTION * 10**9
+
+
+def write_change(path, added=None, removed=None):
+    """Writes a change to path.
+
+    `added` and `removed` are lists of remote paths relative to the
+    remote root, using '/' as a separator.
+    """
+    with open(path, "w") as f:
+        for remote_path in removed or []:
+            f.write(f"- {remote_path}\n")
+        for remote_path in added or []:
+            f.write(f"+ {remote_path}\n")
+
+
+def sync_changed_meta(local_sync_dir, meta_id, sync_changes_cb, sync_paths_cb):
+    """Syncs metadata for remote paths changed since the last sync.
+
+    `meta_id` is the current remote meta ID. `sync_changes_cb` is
+    called to sync new changes from the remote change log to the
+    local `changes` directory. It's called with the key after which
+    to list changes (see `changes_start_after`). `sync_paths_cb` is
+    called with a list of remote paths to sync metadata for.
+
+    Returns True if local metadata is synced with `meta_id`. Returns
+    False if changes can't be applied, in which case metadata must be
+    synced for all runs.
+    """
+    changes_dir = os.path.join(local_sync_dir, CHANGES_PATH)
+    local_id = local_meta_id(local_sync_dir)
+    if local_id is None or not os.path.isdir(changes_dir):
+        log.debug("local changes not found, cannot sync changed meta")
+        return False
+    if not _retained_since(local_id, meta_id):
+        log.debug("meta-id %s is past change log retention", local_id)
+        return False
+    synced_changes = set(os.listdir(changes_dir))
+    sync_changes_cb(changes_start_after(synced_changes | {local_id}))
+    new_changes = sorted(set(os.listdir(changes_dir)) - synced_changes)
+    if meta_id not in synced_changes and meta_id not in new_changes:
+        log.debug("meta-id %s not in change log, cannot sync changed meta", meta_id)
+        return False
+    changed = _changed_paths(changes_dir, new_changes)
+    if len(changed) > MAX_CHANGED_PATHS:
+        log.debug("%i changed paths, syncing all meta", len(changed))
+        return False
+    clear_local_meta_id(local_sync_dir)
+    for remote_path in changed:
+        util.ensure_safe_rmtree(_local_path(local_sync_dir, remote_path))
+    added = [remote_path for remote_path, op in changed.items() if op == "+"]
+    if added:
+        sync_paths_cb(added)
+    write_local_meta_id(meta_id, local_sync_dir)
+    return True
+
+
+def _changed_paths(changes_dir, changes):
+    """Returns a dict of changed remote paths to their last change op."""
+    changed = {}
+    for change in changes:
+        with open(os.path.join(changes_dir, change)) as f:
+            for line in f:
+                op, _, remote_path = line.rstrip("\n").partition(" ")
+                if op in ("+", "-") and _valid_change_path(remote_path):
+                    changed[remote_path] = op
+    return changed
+
+
+def _valid_change_path(remote_path):
+    return remote_path and all(
+        part not in ("", ".", "..") for part in remote_path.split("/")
+    )
+
+
+def _local_path(local_sync_dir, remote_path):
+    return os.path.join(local_sync_dir, *remote_path.split("/"))
+
+
+def init_local_changes(local_sync_dir):
+    """Ensures that the local changes directory exists.
+
+    Call after syncing metadata for all runs so that subsequent syncs
+    can apply changes.
+    """
+    util.ensure_dir(os.path.join(local_sync_dir, CHANGES_PATH))
+
+
+def prune_local_changes(local_sync_dir, meta_id):
+    """Removes local changes that were made after meta_id.
+
+    Pruned changes are applied on the next sync.
+    """
+    changes_dir = os.path.join(local_sync_dir, CHANGES_PATH)
+    for change in os.listdir(changes_dir):
+        if change > meta_id:
+            os.remove(os.path.join(changes_dir, change))
+
+
+def prune_old_local_changes(local_sync_dir, meta_id):
+    """Removes local changes that are prunable for meta_id.
+
+    See `prunable_changes` for details.
+    """
+    changes_dir = os.path.join(local_sync_dir, CHANGES_PATH)
+    for change in prunable_changes(os.listdir(changes_dir), meta_id):
+        os.remove(os.path.join(changes_dir, change))
+
+
+def meta_bundle_due(local_sync_dir):
+    """Returns True if a meta bundle should be written for local metadata.
+
+    A bundle is due when local metadata is synced and either the last
+    bundle written or unpacked locally isn't known, it precedes the
+    change log retention horizon, or more than
+    `META_BUNDLE_CHANGED_PATHS` paths changed since the bundle.
+    """
+    meta_id = local_meta_id(local_sync_dir)
+    if meta_id is None:
+        return False
+    bundle_id = local_meta_bundle_id(local_sync_dir)
+    if bundle_id is None or not _retained_since(bundle_id, meta_id):
+        return True
+    if bundle_id == meta_id:
+        return False
+    changes_dir = os.path.join(local_sync_dir, CHANGES_PATH)
+    changes = [
+        change for change in util.safe_listdir(changes_dir)
+        if bundle_id < change <= meta_id
+    ]
+    return len(_changed_paths(changes_dir, changes)) > META_BUNDLE_CHANGED_PATHS
+
+
+def write_meta_bundle(local_sync_dir, path):
+    """Writes a meta bundle for local metadata to path.
+
+    A meta bundle is a gzip compressed JSON lines file. The first line
+    is a header that contains the meta ID of the bundled metadata.
+    Each subsequent line contains the remote path of a run and its
+    metadata files.
+
+    Returns the bundle meta ID or None if local metadata isn't synced,
+    in which case a bundle is not written. Call
+    `write_local_meta_bundle_id` once the bundle is copied to the
+    remote.
+    """
+    meta_id = local_meta_id(local_sync_dir)
+    if meta_id is None:
+        return None
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write(json.dumps({"meta-id": meta_id}) + "\n")
+        for remote_path, files in _iter_local_run_meta(local_sync_dir):
+            f.write(json.dumps({"path": remote_path, "files": files}) + "\n")
+    return meta_id
+
+
+def _iter_local_run_meta(local_sync_dir):
+    for root, dirs, files in os.walk(local_sync_dir):
+        if root == local_sync_dir and CHANGES_PATH in dirs:
+            dirs.remove(CHANGES_PATH)
+        if ".guild" not in dirs:
+            continue
+        dirs[:] = []
+        run_files = _local_run_meta_files(root)
+        if run_files:
+            remote_path = os.path.relpath(root, local_sync_dir)
+            yield remote_path.replace(os.path.sep, "/"), run_files
+
+
+def _local_run_meta_files(run_dir):
+    run_files = {}
+    for root, _dirs, files in os.walk(os.path.join(run_dir, ".guild")):
+        for name in files:
+            path = os.path.join(root, name)
+            relpath = os.path.relpath(path, run_dir).replace(os.path.sep, "/")
+            if not is_meta_file("/" + relpath):
+                continue
+            try:
+                with open(path, encoding="utf-8") as f:
+                    run_files[relpath] = f.read()
+            except (OSError, UnicodeDecodeError) as e:
+                log.debug("cannot bundle %s: %s", path, e)
+    return run_files
+
+
+def unpack_meta_bundle(path, local_sync_dir, meta_id=None):
+    """Replaces local run metadata with the metadata in a meta bundle.
+
+    If `meta_id` is specified, the bundle is only unpacked if its meta
+    ID is `meta_id`. Returns the bundle meta ID if the bundle is
+    unpacked, otherwise returns None.
+
+    The local meta ID is cleared when the bundle is unpacked. Write
+    the local meta ID once local changes are synced.
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        bundle_id = header.get("meta-id")
+        if not bundle_id or meta_id is not None and bundle_id != meta_id:
+            log.debug("meta bundle meta-id %s does not match %s", bundle_id, meta_id)
+            return None
+        clear_local_meta_id(local_sync_dir)
+        _clear_local_run_meta(local_sync_dir)
+        for line in f:
+            data = json.loads(line)
+            _unpack_run_meta(data["path"], data["files"], local_sync_dir)
+    write_local_meta_bundle_id(bundle_id, local_sync_dir)
+    return bundle_id
+
+
+def _clear_local_run_meta(local_sync_dir):
+    for name in os.listdir(local_sync_dir):
+        if name not in (CHANGES_PATH, "meta-id", LOCAL_META_BUNDLE_ID):
+            util.ensure_safe_rmtree(os.path.join(local_sync_dir, name))
+
+
+def _unpack_run_meta(remote_path, files, local_sync_dir):
+    if not _valid_change_path(remote_path):
+        log.debug("invalid path in meta bundle: %s", remote_path)
+        return
+    run_dir = _local_path(local_sync_dir, remote_path)
+    for relpath, contents in files.items():
+        if not _valid_change_path(relpath) or not is_meta_file("/" + relpath):
+            log.debug("invalid file in meta bundle: %s", relpath)
+            continue
+        path = os.path.join(run_dir, *relpath.split("/"))
+        util.ensure_dir(os.path.dirname(path))
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(contents)
@@ -12,12 +12,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import concurrent.futures
 import itertools
+import json
 import logging
 import os
 import subprocess
 import sys
-import uuid
 
 from guild import remote as remotelib
 from guild import remote_util
@@ -31,6 +32,11 @@ log = logging.getLogger("guild.remotes.s3")
 RUNS_PATH = ["runs"]
 DELETED_RUNS_PATH = ["trash", "runs"]
 
+DEFAULT_TRANSFER_STREAMS = 4
+
+# Max number of objects that can be deleted by a single S3 request.
+MAX_DELETE_OBJECTS = 1000
+
 
 class S3RemoteType(remotelib.RemoteType):
     def __init__(self, _ep):
@@ -71,6 +77,9 @@ class S3Remote(meta_sync.MetaSyncRemote):
         self.root = config.get("root", "/")
         self.region = config.get("region")
         self.local_env = remote_util.init_env(config.get("local-env"))
+        self.transfer_streams = (
+            config.get("transfer-streams") or DEFAULT_TRANSFER_STREAMS
+        )
         self.local_sync_dir = meta_sync.local_meta_dir(name, self._s3_uri())
         runs_dir = os.path.join(self.local_sync_dir, *RUNS_PATH)
         deleted_runs_dir = os.path.join(self.local_sync_dir, *DELETED_RUNS_PATH)
@@ -82,7 +91,37 @@ class S3Remote(meta_sync.MetaSyncRemote):
 
     def _sync_runs_meta(self, force=False):
         remote_util.remote_activity(f"Refreshing run info for {self.name}")
-        if not force and self._meta_current():
+        local_meta_id = meta_sync.local_meta_id(self.local_sync_dir)
+        if local_meta_id is None:
+            log.debug("local meta-id not found, meta not current")
+            self._sync_all_runs_meta(self._try_remote_meta_id())
+        else:
+            remote_meta_id = self._remote_meta_id()
+            log.debug("local meta-id: %s", local_meta_id)
+            log.debug("remote meta-id: %s", remote_meta_id)
+            if not force and local_meta_id == remote_meta_id:
+                return
+            if not meta_sync.sync_changed_meta(
+                self.local_sync_dir,
+                remote_meta_id,
+                self._sync_changes,
+                self._sync_paths_meta,
+            ):
+                self._sync_all_runs_meta(remote_meta_id)
+        if force and meta_sync.meta_bundle_due(self.local_sync_dir):
+            # Forced syncs follow changes to the remote so update the
+            # remote meta bundle when enough has changed.
+            self._write_meta_bundle()
+
+    def _try_remote_meta_id(self):
+        try:
+            return self._remote_meta_id()
+        except remotelib.RemoteProcessError as e:
+            log.debug("cannot get remote meta-id: %s", e)
+            return None
+
+    def _sync_all_runs_meta(self, remote_meta_id):
+        if remote_meta_id and self._sync_meta_bundle(remote_meta_id):
             return
         meta_sync.clear_local_meta_id(self.local_sync_dir)
         sync_args = [
@@ -102,9 +141,159 @@ class S3Remote(meta_sync.MetaSyncRemote):
             "--exact-timestamps",
         ]
         self._s3_cmd("sync", sync_args, quiet=True)
+        local_meta_id = meta_sync.local_meta_id(self.local_sync_dir)
+        if local_meta_id is not None:
+            self._sync_changes_since(local_meta_id)
+
+    def _sync_changes_since(self, meta_id):
+        """Syncs changes following meta_id to the local change log.
+
+        Local changes made after meta_id are pruned so they're applied
+        on the next sync.
+        """
+        meta_sync.init_local_changes(self.local_sync_dir)
+        self._sync_changes(meta_sync.changes_start_after([meta_id]))
+        meta_sync.prune_local_changes(self.local_sync_dir, meta_id)
+        meta_sync.prune_old_local_changes(self.local_sync_dir, meta_id)
+
+    def _sync_meta_bundle(self, remote_meta_id):
+        util.ensure_dir(self.local_sync_dir)
+        with util.TempFile("guild-s3-") as tmp:
+            try:
+                self._s3api_output(
+                    "get-object",
+                    [
+                        "--bucket",
+                        self.bucket,
+                        "--key",
+                        _join_path(self.root, meta_sync.META_BUNDLE_NAME),
+                        tmp.path,
+                    ],
+                )
+            except remotelib.RemoteProcessError as e:
+                log.debug("cannot get meta bundle: %s", e)
+                return False
+            bundle_id = meta_sync.unpack_meta_bundle(tmp.path, self.local_sync_dir)
+            if not bundle_id:
+                return False
+        if bundle_id == remote_meta_id:
+            self._sync_changes_since(remote_meta_id)
+            meta_sync.write_local_meta_id(remote_meta_id, self.local_sync_dir)
+            return True
+        # Bundle precedes the remote meta ID - apply changes made since
+        # the bundle.
+        meta_sync.init_local_changes(self.local_sync_dir)
+        meta_sync.prune_local_changes(self.local_sync_dir, bundle_id)
+        meta_sync.write_local_meta_id(bundle_id, self.local_sync_dir)
+        return meta_sync.sync_changed_meta(
+            self.local_sync_dir,
+            remote_meta_id,
+            self._sync_changes,
+            self._sync_paths_meta,
+        )
+
+    def _write_meta_bundle(self):
+        with util.TempFile("guild-s3-") as tmp:
+            meta_id = meta_sync.write_meta_bundle(self.local_sync_dir, tmp.path)
+            if not meta_id:
+                return
+            self._s3_put_object(tmp.path, meta_sync.META_BUNDLE_NAME)
+        meta_sync.write_local_meta_bundle_id(meta_id, self.local_sync_dir)
+        self._prune_changes(meta_id)
+
+    def _prune_changes(self, meta_id):
+        """Deletes remote changes that are prunable for meta_id.
+
+        Changes are pruned once a meta bundle is written for meta_id so
+        that remotes that are past the change log retention can sync
+        from the bundle.
+        """
+        prunable = meta_sync.prunable_changes(self._list_changes(), meta_id)
+        for i in range(0, len(prunable), MAX_DELETE_OBJECTS):
+            batch = prunable[i:i + MAX_DELETE_OBJECTS]
+            objects = [{"Key": self._change_key(change_id)} for change_id in batch]
+            delete = json.dumps({"Objects": objects, "Quiet": True})
+            self._s3api_output(
+                "delete-objects", ["--bucket", self.bucket, "--delete", delete]
+            )
+        meta_sync.prune_old_local_changes(self.local_sync_dir, meta_id)
+
+    def _sync_changes(self, start_after=None):
+        """Copies remote changes that aren't synced to the local change log.
+
+        Only changes listed after start_after are copied.
+        """
+        changes_dir = os.path.join(self.local_sync_dir, meta_sync.CHANGES_PATH)
+        synced = set(os.listdir(changes_dir))
+        new_changes = [
+            change_id for change_id in self._list_changes(start_after)
+            if change_id not in synced
+        ]
+        if not new_changes:
+            return
+        max_workers = min(len(new_changes), self.transfer_streams)
+        with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+            list(
+                executor.map(
+                    lambda change_id: self._get_change(change_id, changes_dir),
+                    new_changes,
+                )
+            )
+
+    def _list_changes(self, start_after=None):
+        prefix = _join_path(self.root, meta_sync.CHANGES_PATH) + "/"
+        args = [
+            "--bucket",
+            self.bucket,
+            "--prefix",
+            prefix,
+            "--query",
+            "Contents[].Key",
+            "--output",
+            "json",
+        ]
+        if start_after:
+            args.extend(["--start-after", prefix + start_after])
+        keys = json.loads(self._s3api_output("list-objects-v2", args)) or []
+        return [key[len(prefix):] for key in keys if key.startswith(prefix)]
+
+    def _get_change(self, change_id, changes_dir):
+        # Copy to a temp file alongside the change log so that partial
+        # copies aren't taken as synced changes.
+        tmp_path = os.path.join(self.local_sync_dir, f".{change_id}.tmp")
+        args = [
+            "--bucket",
+            self.bucket,
+            "--key",
+            self._change_key(change_id),
+            tmp_path,
+        ]
+        self._s3api_output("get-object", args)
+        os.replace(tmp_path, os.path.join(changes_dir, change_id))
 
-    def _meta_current(self):
-        return meta_sync.meta_current(self.local_sync_dir, self._remote_meta_id)
+    def _change_key(self, change_id):
+        return _join_path(self.root, meta_sync.CHANGES_PATH, change_id)
+
+    def _sync_paths_meta(self, paths):
+        max_workers = min(len(paths), self.transfer_streams)
+        with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+            list(executor.map(self._sync_path_meta, paths))
+
+    def _sync_path_meta(self, path):
+        sync_args = [
+            self._s3_uri(path),
+            os.path.join(self.local_sync_dir, *path.split("/")),
+            "--exclude",
+            "*",
+            "--include",
+            ".guild/opref",
+            "--include",
+            ".guild/attrs/*",
+            "--include",
+            ".guild/LOCK*",
+            "--exact-timestamps",
+        ]
+        self._s3_cmd("sync", sync_args, quiet=True)
 
     def _remote_meta_id(self):
         with util.TempFile("guild-s3-") as tmp:
@@ -156,7 +345,10 @@ class S3Remote(meta_sync.MetaSyncRemote):
             else:
                 deleted_uri = self._s3_uri(*(DELETED_RUNS_PATH + [run.id]))
                 self._s3_mv(run_uri, deleted_uri)
-        self._new_meta_id()
+        self._new_meta_id(
+            added=[] if permanent else _run_paths(runs, DELETED_RUNS_PATH),
+            removed=_run_paths(runs, RUNS_PATH),
+        )
 
     def _s3_rm(self, uri):
         rm_args = ["--recursive", uri]
@@ -171,13 +363,16 @@ class S3Remote(meta_sync.MetaSyncRemote):
             deleted_uri = self._s3_uri(*(DELETED_RUNS_PATH + [run.id]))
             restored_uri = self._s3_uri(*(RUNS_PATH + [run.id]))
             self._s3_mv(deleted_uri, restored_uri)
-        self._new_meta_id()
+        self._new_meta_id(
+            added=_run_paths(runs, RUNS_PATH),
+            removed=_run_paths(runs, DELETED_RUNS_PATH),
+        )
 
     def _purge_runs(self, runs):
         for run in runs:
             uri = self._s3_uri(*(DELETED_RUNS_PATH + [run.id]))
             self._s3_rm(uri)
-        self._new_meta_id()
+        self._new_meta_id(removed=_run_paths(runs, DELETED_RUNS_PATH))
 
     def status(self, verbose=False):
         try:
@@ -216,10 +411,38 @@ class S3Remote(meta_sync.MetaSyncRemote):
         return f"S3 bucket {self.bucket} will be deleted - THIS CANNOT BE UNDONE!"
 
     def push(self, runs, delete=False):
-        for run in runs:
+        """Copies runs to the remote.
+
+        Up to `transfer-streams` runs are copied concurrently. The
+        remote meta ID is updated once after runs are copied. Raises
+        OperationError if any run can't be copied.
+        """
+        if not runs:
+            return
+        max_workers = min(len(runs), self.transfer_streams)
+        with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+            pushed = list(
+                executor.map(lambda run: self._try_push_run(run, delete), runs)
+            )
+        pushed_runs = [run for run, ok in zip(runs, pushed) if ok]
+        if pushed_runs:
+            self._new_meta_id(added=_run_paths(pushed_runs, RUNS_PATH))
+            self._sync_runs_meta(force=True)
+        failed = [run for run, ok in zip(runs, pushed) if not ok]
+        if failed:
+            raise remotelib.OperationError(
+                f"error copying {len(failed)} of {len(runs)} run(s) "
+                f"({', '.join(run.short_id for run in failed)})"
+            )
+
+    def _try_push_run(self, run, delete):
+        try:
             self._push_run(run, delete)
-            self._new_meta_id()
-        self._sync_runs_meta(force=True)
+        except (SystemExit, remotelib.RemoteProcessError):
+            log.error("error copying %s", run.id)
+            return False
+        else:
+            return True
 
     def _push_run(self, run, delete):
         local_run_src = os.path.join(run.path, "")
@@ -235,20 +458,29 @@ class S3Remote(meta_sync.MetaSyncRemote):
         log.info("Copying %s to %s", run.id, self.name)
         self._s3_cmd("sync", args, quiet=True)
 
-    def _new_meta_id(self):
-        meta_id = uuid.uuid4().hex
+    def _new_meta_id(self, added=None, removed=None):
+        """Writes a change for added and removed paths.
+
+        The remote meta ID is set to the change ID.
+        """
+        change_id = meta_sync.new_change_id()
         with util.TempFile("guild-s3-") as tmp:
+            meta_sync.write_change(tmp.path, added, removed)
+            self._s3_put_object(tmp.path, meta_sync.CHANGES_PATH, change_id)
             with open(tmp.path, "w") as f:
-                f.write(meta_id)
-            args = [
-                "--bucket",
-                self.bucket,
-                "--key",
-                _join_path(self.root, "meta-id"),
-                "--body",
-                tmp.path,
-            ]
-            self._s3api_output("put-object", args)
+                f.write(change_id)
+            self._s3_put_object(tmp.path, "meta-id")
+
+    def _s3_put_object(self, src, *key_path):
+        args = [
+            "--bucket",
+            self.bucket,
+            "--key",
+            _join_path(self.root, *key_path),
+            "--body",
+            src,
+        ]
+        self._s3api_output("put-object", args)
 
     def pull(self, runs, delete=False):
         for run in runs:
@@ -278,6 +510,10 @@ def _aws_cmd():
     return cmd
 
 
+def _run_paths(runs, base_path):
+    return ["/".join(base_path + [run.id]) for run in runs]
+
+
 def _join_path(root, *parts):
     path = [part for part in itertools.chain([root], parts) if part not in ("/", "")]
     return "/".join(path)
@@ -12,10 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import concurrent.futures
 import glob
 import json
 import os
 import logging
+import math
 import re
 import shutil
 import subprocess
@@ -36,6 +38,8 @@ log = logging.getLogger("guild.remotes.ssh")
 
 DEFAULT_DIFF_CMD = "diff -ru"
 
+DEFAULT_TRANSFER_STREAMS = 4
+
 
 class SSHRemoteType(remotelib.RemoteType):
     def __init__(self, _ep):
@@ -87,6 +91,9 @@ class SSHRemote(remotelib.Remote):
         self.use_prerelease = config.get("use-prerelease", False)
         self.init = config.get("init")
         self.proxy = config.get("proxy")
+        self.transfer_streams = (
+            config.get("transfer-streams") or DEFAULT_TRANSFER_STREAMS
+        )
 
     def _init_guild_home(self, config):
         return util.find_apply(
@@ -131,30 +138,19 @@ class SSHRemote(remotelib.Remote):
         return self._host
 
     def push(self, runs, delete=False):
-        for run in runs:
-            self._push_run(run, delete)
+        self._copy_runs(runs, self._push_cmd, delete)
 
-    def _push_run(self, run, delete):
-        src = run.path + "/"
-        dest_path = f"{self.guild_home}/runs/{run.id}/"
+    def _push_cmd(self, runs_root, files_from, delete, control_path):
+        dest_path = f"{self.guild_home}/runs/"
         dest = ssh_util.format_rsync_host_path(self.host, dest_path, self.user)
-        cmd = (
+        return (
             ["rsync"]  #
             + self._rsync_path_mkdir_opts(dest_path)  #
             + self._push_rsync_opts(delete)  #
-            + [src, dest]
+            + self._files_from_opts(files_from)  #
+            + [runs_root + "/", dest]  #
+            + self._rsync_ssh_opts(control_path)
         )
-        cmd.extend(
-            ssh_util.rsync_ssh_opts(
-                remote_util.config_path(self.private_key),
-                self.connect_timeout,
-                self.port,
-                self.proxy,
-            )
-        )
-        log.info("Copying %s", run.id)
-        log.debug("rsync cmd: %r", cmd)
-        subprocess.check_call(cmd)
 
     @staticmethod
     def _rsync_path_mkdir_opts(dest):
@@ -172,28 +168,35 @@ class SSHRemote(remotelib.Remote):
             opts.append("-v")
         return opts
 
+    @staticmethod
+    def _files_from_opts(files_from):
+        # `-a` doesn't imply `-r` when `--files-from` is used.
+        return ["-r", "--files-from", files_from]
+
+    def _rsync_ssh_opts(self, control_path):
+        return ssh_util.rsync_ssh_opts(
+            remote_util.config_path(self.private_key),
+            self.connect_timeout,
+            self.port,
+            self.proxy,
+            control_path,
+        )
+
     def pull(self, runs, delete=False):
-        for run in runs:
-            self._pull_run(run, delete)
+        self._copy_runs(runs, self._pull_cmd, delete, self._on_pulled)
 
-    def _pull_run(self, run, delete):
-        src_path = f"{self.guild_home}/runs/{run.id}/"
+    def _pull_cmd(self, _runs_root, files_from, delete, control_path):
+        src_path = f"{self.guild_home}/runs/"
         src = ssh_util.format_rsync_host_path(self.host, src_path, self.user)
-        dest = os.path.join(var.runs_dir(), run.id + "/")
-        util.ensure_dir(os.path.dirname(dest))
-        cmd = ["rsync"] + self._pull_rsync_opts(delete) + [src, dest]
-        cmd.extend(
-            ssh_util.rsync_ssh_opts(
-                remote_util.config_path(self.private_key),
-                self.connect_timeout,
-                self.port,
-                self.proxy,
-            )
+        dest = var.runs_dir() + "/"
+        util.ensure_dir(dest)
+        return (
+            ["rsync"]  #
+            + self._pull_rsync_opts(delete)  #
+            + self._files_from_opts(files_from)  #
+            + [src, dest]  #
+            + self._rsync_ssh_opts(control_path)
         )
-        log.info("Copying %s", run.id)
-        log.debug("rsync cmd: %r", cmd)
-        subprocess.check_call(cmd)
-        remote_util.set_remote_lock(run, self.name)
 
     @staticmethod
     def _pull_rsync_opts(delete):
@@ -213,6 +216,85 @@ class SSHRemote(remotelib.Remote):
             opts.append("-v")
         return opts
 
+    def _on_pulled(self, run):
+        remote_util.set_remote_lock(run, self.name)
+
+    def _copy_runs(self, runs, cmd_f, delete, on_copied=None):
+        """Copies runs using rsync commands generated by `cmd_f`.
+
+        Runs are copied in groups, one rsync command per group, over a
+        shared ssh connection. Up to `transfer-streams` groups are
+        copied concurrently.
+
+        If a group fails, its runs are copied one at a time to
+        determine which runs failed. Raises OperationError if any run
+        can't be copied.
+        """
+        if not runs:
+            return
+        groups = _runs_transfer_groups(runs, self.transfer_streams)
+        with self._control_master() as master:
+
+            def copy_group(group):
+                return self._copy_runs_group(
+                    group, cmd_f, delete, master.control_path, on_copied
+                )
+
+            max_workers = min(len(groups), self.transfer_streams)
+            with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+                failed = [
+                    run for group_failed in executor.map(copy_group, groups)
+                    for run in group_failed
+                ]
+        if failed:
+            raise remotelib.OperationError(
+                f"error copying {len(failed)} of {len(runs)} run(s) "
+                f"({', '.join(run.short_id for run in failed)})"
+            )
+
+    def _control_master(self):
+        return ssh_util.ControlMaster(
+            self.host,
+            self.user,
+            remote_util.config_path(self.private_key),
+            self.connect_timeout,
+            self.port,
+            self.proxy,
+        )
+
+    def _copy_runs_group(self, group, cmd_f, delete, control_path, on_copied):
+        runs_root, runs = group
+        for run in runs:
+            log.info("Copying %s", run.id)
+        if self._rsync_runs(runs_root, runs, cmd_f, delete, control_path):
+            copied, failed = runs, []
+        elif len(runs) == 1:
+            copied, failed = [], runs
+        else:
+            copied, failed = [], []
+            for run in runs:
+                log.info("Copying %s (retry)", run.id)
+                if self._rsync_runs(runs_root, [run], cmd_f, delete, control_path):
+                    copied.append(run)
+                else:
+                    failed.append(run)
+        for run in failed:
+            log.error("error copying %s", run.id)
+        if on_copied:
+            for run in copied:
+                on_copied(run)
+        return failed
+
+    @staticmethod
+    def _rsync_runs(runs_root, runs, cmd_f, delete, control_path):
+        with util.TempFile("guild-rsync-files-") as files_from:
+            with open(files_from.path, "w") as f:
+                for run in runs:
+                    f.write(run.id + "\n")
+            cmd = cmd_f(runs_root, files_from.path, delete, control_path)
+            log.debug("rsync cmd: %r", cmd)
+            return subprocess.call(cmd) == 0
+
     def reinit(self):
         if not self.init:
             raise remotelib.OperationNotSupported("init is not defined for this remote")
@@ -536,6 +618,23 @@ class SSHRemote(remotelib.Remote):
         self._guild_cmd("select", _select_args(**opts))
 
 
+def _runs_transfer_groups(runs, max_groups):
+    """Returns a list of `(runs_root, runs)` groups for copying runs.
+
+    Runs are grouped by their parent directory and split into groups
+    of similar size so that runs can be copied using up to
+    `max_groups` concurrent transfers.
+    """
+    by_root = {}
+    for run in runs:
+        by_root.setdefault(os.path.dirname(run.path), []).append(run)
+    group_size = max(1, math.ceil(len(runs) / max_groups))
+    return [
+        (root, root_runs[i:i + group_size]) for root, root_runs in by_root.items()
+        for i in range(0, len(root_runs), group_size)
+    ]
+
+
 def _join_args(args):
     try:
         return " ".join(args)
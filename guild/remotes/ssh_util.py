@@ -13,9 +13,12 @@
 # limitations under the License.
 
 import logging
+import os
 import subprocess
+import tempfile
 
 from guild import remote as remotelib
+from guild import util
 
 log = logging.getLogger("guild.remotes.ssh_util")
 
@@ -131,12 +134,18 @@ def format_rsync_host_path(host, path, user):
     return f"{host}:{path}"
 
 
-def rsync_ssh_opts(private_key=None, connect_timeout=None, port=None, proxy=None):
-    ssh_cmd = _rsync_ssh_cmd(private_key, connect_timeout, port, proxy)
+def rsync_ssh_opts(
+    private_key=None,
+    connect_timeout=None,
+    port=None,
+    proxy=None,
+    control_path=None,
+):
+    ssh_cmd = _rsync_ssh_cmd(private_key, connect_timeout, port, proxy, control_path)
     return ["-e", ssh_cmd]
 
 
-def _rsync_ssh_cmd(private_key, connect_timeout, port, proxy):
+def _rsync_ssh_cmd(private_key, connect_timeout, port, proxy, control_path):
     parts = ["ssh"]
     if private_key:
         parts.append(f"-i '{private_key}'")
@@ -146,4 +155,100 @@ def _rsync_ssh_cmd(private_key, connect_timeout, port, proxy):
         parts.append(f"-p {port}")
     if proxy:
         parts.append(f"-o 'ProxyCommand {proxy}'")
+    if control_path:
+        # Use the shared connection if available, otherwise connect
+        # directly.
+        parts.append(f"-o 'ControlPath {control_path}' -oControlMaster=no")
     return " ".join(parts)
+
+
+class ControlMaster:
+    """Shared ssh connection for use by multiple commands.
+
+    Use as a context manager. When started, `control_path` is the
+    path to the connection socket, which is used with the ssh
+    `ControlPath` option. `control_path` is None if a shared
+    connection can't be started, in which case commands connect
+    directly.
+
+    Set `NO_SSH_CONTROL_MASTER=1` to disable shared connections.
+    """
+
+    control_path = None
+
+    def __init__(
+        self,
+        host,
+        user=None,
+        private_key=None,
+        connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+        port=None,
+        proxy=None,
+    ):
+        self.host = _full_host(host, user)
+        self._ssh_opts = _ssh_opts(private_key, False, connect_timeout, port, proxy)
+        self._tmp_dir = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *_exc):
+        self.stop()
+
+    def start(self):
+        if not _control_master_supported():
+            return False
+        self._tmp_dir = tempfile.mkdtemp(prefix="guild-ssh-")
+        # Use a literal socket name rather than a token like `%C`,
+        # which expands differently for commands that don't use the
+        # same connection options.
+        control_path = os.path.join(self._tmp_dir, "master")
+        cmd = (
+            ["ssh"]  #
+            + self._ssh_opts  #
+            + [
+                "-MNf",
+                "-oControlPersist=yes",
+                f"-oControlPath={control_path}",
+                self.host,
+            ]
+        )
+        log.debug("ssh cmd: %r", cmd)
+        if subprocess.call(cmd) != 0:
+            log.debug("cannot start ssh control master for %s", self.host)
+            self._cleanup()
+            return False
+        self.control_path = control_path
+        return True
+
+    def stop(self):
+        if self.control_path:
+            cmd = (
+                ["ssh"]  #
+                + self._ssh_opts  #
+                + ["-O", "exit", f"-oControlPath={self.control_path}", self.host]
+            )
+            log.debug("ssh cmd: %r", cmd)
+            p = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            _out, err = p.communicate()
+            if p.returncode != 0:
+                log.warning(
+                    "cannot stop ssh control master for %s: %s",
+                    self.host,
+                    err.decode(errors="replace").strip(),
+                )
+            self.control_path = None
+        self._cleanup()
+
+    def _cleanup(self):
+        if self._tmp_dir:
+            util.ensure_safe_rmtree(self._tmp_dir)
+            self._tmp_dir = None
+
+
+def _control_master_supported():
+    if os.getenv("NO_SSH_CONTROL_MASTER") == "1":
+        return False
+    # OpenSSH for Windows doesn't support connection sharing.
+    return os.name != "nt"
@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
 import os
 import random
 import threading
@@ -77,6 +78,7 @@ class Run:
         self.path = path
         self._guild_dir = os.path.join(self.path, ".guild")
         self._opref = None
+        self._catalog_entry = None
         self._props = util.PropertyCache(
             [
                 ("timestamp", None, self._get_timestamp, 1.0),
@@ -107,6 +109,9 @@ class Run:
         return self._opref
 
     def _read_opref(self):
+        entry = self._valid_catalog_entry()
+        if entry is not None:
+            return entry.opref
         return util.try_read(self._opref_path())
 
     def _opref_path(self):
@@ -118,10 +123,36 @@ class Run:
     def write_encoded_opref(self, encoded):
         with open(self._opref_path(), "w") as f:
             f.write(encoded)
-        self._opref = None
+        _touch_dir(self._guild_dir)
+        self.reset_opref()
 
     def reset_opref(self):
         self._opref = None
+        self._catalog_entry = None
+
+    def apply_catalog_entry(self, entry):
+        """Use attributes cached in a run catalog entry.
+
+        Cached attributes are a snapshot of the run at the time the
+        entry was read. The entry is used as long as the run mtimes
+        recorded for it are unchanged. The entry is dropped when the
+        run changes or is modified using this object, after which
+        attributes are read from the run directory.
+        """
+        self._catalog_entry = entry
+        self._opref = None
+
+    def reset_catalog_entry(self):
+        self._catalog_entry = None
+
+    def _valid_catalog_entry(self):
+        entry = self._catalog_entry
+        if entry is None:
+            return None
+        if entry.mtimes is None or _run_mtimes(self.path) != entry.mtimes:
+            self._catalog_entry = None
+            return None
+        return entry
 
     @property
     def pid(self):
@@ -141,14 +172,20 @@ class Run:
 
     @property
     def status(self):
-        if os.path.exists(self.guild_path("LOCK.remote")):
+        entry = self._valid_catalog_entry()
+        if self._has_marker("LOCK.remote", entry):
             return "running"
-        if os.path.exists(self.guild_path("PENDING")):
+        if self._has_marker("PENDING", entry):
             return "pending"
-        if os.path.exists(self.guild_path("STAGED")):
+        if self._has_marker("STAGED", entry):
             return "staged"
         return self._local_status()
 
+    def _has_marker(self, name, entry):
+        if entry is not None:
+            return name in entry.markers
+        return os.path.exists(self.guild_path(name))
+
     @property
     def remote(self):
         remote_lock_path = self.guild_path("LOCK.remote")
@@ -206,6 +243,9 @@ class Run:
                 pass
 
     def __getitem__(self, name):
+        entry = self._valid_catalog_entry()
+        if entry is not None and name in entry.attr_names:
+            return _copy_cached_attr(entry.attrs, name)
         try:
             f = open(self._attr_path(name), "r")
         except IOError as e:
@@ -243,12 +283,17 @@ class Run:
             f.write(val)
             f.write(os.linesep)
             f.close()
+        # Rewriting an existing attr doesn't otherwise change the
+        # attrs dir mtime, which is used to invalidate catalog entries.
+        _touch_dir(self._attrs_dir())
+        self._catalog_entry = None
 
     def del_attr(self, name):
         try:
             os.remove(self._attr_path(name))
         except OSError:
             pass
+        self._catalog_entry = None
 
     def iter_files(self, all_files=False, follow_links=False):
         for root, dirs, files in os.walk(self.path, followlinks=follow_links):
@@ -275,6 +320,31 @@ class Run:
                     yield os.path.join(rel_root, name)
 
 
+def _copy_cached_attr(attrs, name):
+    try:
+        val = attrs[name]
+    except KeyError:
+        raise KeyError(name) from None
+    else:
+        # Copy mutable values as callers may modify what's returned.
+        if isinstance(val, (dict, list)):
+            return copy.deepcopy(val)
+        return val
+
+
+def _run_mtimes(run_dir):
+    from guild import run_catalog
+
+    return run_catalog.run_mtimes(run_dir)
+
+
+def _touch_dir(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
 def _status_for_exit_status(exit_status):
     assert exit_status is not None, exit_status
     if exit_status == 0:
@@ -0,0 +1,365 @@
+# Copyright 2017-2023 Posit Software, PBC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Persistent catalog of run metadata.
+
+The catalog caches the run attributes that are used to list, filter,
+and sort runs so that they don't have to be read and parsed from each
+run directory every time runs are listed.
+
+A catalog entry is valid as long as the mtimes of the run `.guild`
+and `.guild/attrs` directories are unchanged. Run markers and the run
+opref are stored directly under `.guild` and so change the `.guild`
+mtime. `Run.write_attr` touches the attrs directory so that rewriting
+an existing attribute invalidates the entry. The `exit_status`
+attribute mtime is also checked as run status depends on it.
+
+Runs listed using the catalog keep their entries. An entry is
+revalidated using its mtimes each time a run reads from it, so that
+changes made after runs are listed are read from the run directory.
+Entries for runs modified within `RACY_WINDOW` seconds can't be
+revalidated and are only used to list runs.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import time
+
+import yaml
+
+from guild import run as runlib
+from guild import util
+from guild import var
+from guild import yaml_util
+
+log = logging.getLogger("guild")
+
+VERSION = 1
+DB_NAME = f"catalog_v{VERSION}.db"
+
+CATALOG_ATTRS = frozenset(
+    [
+        "exit_status",
+        "flags",
+        "initialized",
+        "label",
+        "marked",
+        "sourcecode_digest",
+        "started",
+        "stopped",
+        "tags",
+    ]
+)
+
+STATUS_MARKERS = ("LOCK.remote", "PENDING", "STAGED")
+
+# Entries for runs modified within this many seconds aren't saved as
+# changes made in that window may not change directory mtimes on file
+# systems with coarse mtime resolution.
+RACY_WINDOW = 2.0
+
+
+class CatalogEntry:
+    attr_names = CATALOG_ATTRS
+
+    def __init__(self, opref, attrs, markers, encoded_attrs=None, mtimes=None):
+        self.opref = opref
+        self.attrs = attrs
+        self.markers = markers
+        self.encoded_attrs = encoded_attrs
+        # Run mtimes the entry is valid for (see `run_mtimes`) or None
+        # if the entry can't be validated.
+        self.mtimes = mtimes
+
+
+class RunCatalog:
+    """Interface for using a run catalog."""
+    def __init__(self, path=None):
+        self.path = path or var.cache_dir("runs")
+        self._db = self._init_db()
+
+    def _init_db(self):
+        db_path = self._db_path()
+        util.ensure_dir(os.path.dirname(db_path))
+        db = sqlite3.connect(db_path, timeout=5.0)
+        _init_catalog_tables(db)
+        return db
+
+    def _db_path(self):
+        return os.path.join(self.path, DB_NAME)
+
+    def close(self):
+        self._db.close()
+
+    def runs(self, root):
+        """Returns runs under `root` with cached catalog entries.
+
+        Runs whose entries are missing or stale are read from disk and
+        the catalog is updated for them.
+        """
+        return [run for run, _mtimes in self.runs_with_mtimes(root)]
+
+    def runs_with_mtimes(self, root):
+        """Returns a list of runs and their mtimes under `root`.
+
+        Mtimes are those read before the run catalog entry is read (see
+        `run_mtimes`).
+        """
+        root = os.path.abspath(root)
+        cached = self._root_entries(root)
+        runs = []
+        updates = []
+        racy_mtime = _mtime_ns(time.time() - RACY_WINDOW)
+        for name in _safe_listdir(root):
+            path = os.path.join(root, name)
+            mtimes = run_mtimes(path)
+            if mtimes is None:
+                continue
+            entry = _valid_entry(cached.pop(name, None), mtimes)
+            if entry is None:
+                try:
+                    entry = _read_entry(path)
+                except yaml.YAMLError as e:
+                    # Leave errors to be reported when attrs are read.
+                    log.debug("cannot read catalog entry for %s: %s", path, e)
+                    runs.append((runlib.Run(name, path), mtimes))
+                    continue
+                if entry is None:
+                    continue
+                if max(mtimes) < racy_mtime:
+                    entry.mtimes = mtimes
+                    updates.append((root, name) + mtimes + _encode_entry(entry))
+            run = runlib.Run(name, path)
+            run.apply_catalog_entry(entry)
+            runs.append((run, mtimes))
+        self._apply_changes(root, updates, list(cached))
+        return runs
+
+    def _root_entries(self, root):
+        cur = self._db.execute(
+            """
+          SELECT id, guild_mtime, attrs_mtime, opref, markers, attrs
+          FROM run WHERE root = ?
+        """,
+            (root,),
+        )
+        return {row[0]: row[1:] for row in cur.fetchall()}
+
+    def _apply_changes(self, root, updates, deleted):
+        if not updates and not deleted:
+            return
+        try:
+            with self._db:
+                self._db.executemany(
+                    """
+                  INSERT OR REPLACE INTO run
+                  VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                    updates,
+                )
+                self._db.executemany(
+                    """
+                  DELETE FROM run WHERE root = ? AND id = ?
+                """,
+                    [(root, run_id) for run_id in deleted],
+                )
+        except sqlite3.OperationalError as e:
+            # Catalog is a cache - another process may be updating it.
+            log.debug("cannot update run catalog: %s", e)
+
+
+def _init_catalog_tables(db):
+    db.execute(
+        """
+      CREATE TABLE IF NOT EXISTS run (
+        root,
+        id,
+        guild_mtime,
+        attrs_mtime,
+        opref,
+        markers,
+        attrs
+      )
+    """
+    )
+    db.execute(
+        """
+      CREATE UNIQUE INDEX IF NOT EXISTS run_pk
+      ON run (root, id)
+    """
+    )
+
+
+def _safe_listdir(path):
+    try:
+        return os.listdir(path)
+    except OSError:
+        return []
+
+
+def _mtime_ns(t):
+    return int(t * 1000000000)
+
+
+def run_mtimes(run_dir):
+    guild_dir = os.path.join(run_dir, ".guild")
+    try:
+        guild_mtime = os.stat(guild_dir).st_mtime_ns
+    except OSError:
+        return None
+    attrs_dir = os.path.join(guild_dir, "attrs")
+    # Run status is inferred from `exit_status`, which may be rewritten
+    # in place without changing the attrs directory mtime.
+    attrs_mtime = max(
+        _safe_mtime_ns(attrs_dir),
+        _safe_mtime_ns(os.path.join(attrs_dir, "exit_status")),
+    )
+    return guild_mtime, attrs_mtime
+
+
+def runs_mtimes(root, names=None):
+    """Returns a dict of run names to run mtimes for runs under root.
+
+    `names` limits the runs to stat. If not specified, all runs under
+    root are used. Names that aren't runs are omitted.
+    """
+    if names is None:
+        names = util.safe_listdir(root)
+    mtimes = {}
+    for name in names:
+        run_mtimes_ = run_mtimes(os.path.join(root, name))
+        if run_mtimes_ is not None:
+            mtimes[name] = run_mtimes_
+    return mtimes
+
+
+def _safe_mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def _valid_entry(row, mtimes):
+    if row is None:
+        return None
+    guild_mtime, attrs_mtime, opref, markers, attrs = row
+    if (guild_mtime, attrs_mtime) != mtimes:
+        return None
+    try:
+        return CatalogEntry(
+            opref, _decode_attrs(attrs), _decode_markers(markers), mtimes=mtimes
+        )
+    except (ValueError, yaml.YAMLError) as e:
+        log.debug("invalid catalog entry for %s: %s", opref, e)
+        return None
+
+
+def _read_entry(run_dir):
+    guild_dir = os.path.join(run_dir, ".guild")
+    opref = util.try_read(os.path.join(guild_dir, "opref"))
+    if opref is None:
+        return None
+    attrs, encoded_attrs = _read_attrs(os.path.join(guild_dir, "attrs"))
+    markers = frozenset(
+        name for name in STATUS_MARKERS
+        if os.path.exists(os.path.join(guild_dir, name))
+    )
+    return CatalogEntry(opref, attrs, markers, encoded_attrs)
+
+
+def _read_attrs(attrs_dir):
+    attrs = {}
+    encoded_attrs = {}
+    for name in CATALOG_ATTRS:
+        encoded = util.try_read(os.path.join(attrs_dir, name))
+        if encoded is not None:
+            attrs[name] = yaml_util.fast_safe_load(encoded)
+            encoded_attrs[name] = encoded
+    return attrs, encoded_attrs
+
+
+def _encode_entry(entry):
+    return (
+        entry.opref,
+        ",".join(sorted(entry.markers)),
+        json.dumps(
+            {
+                name: _encode_attr(val, entry.encoded_attrs[name])
+                for name, val in entry.attrs.items()
+            }
+        ),
+    )
+
+
+def _encode_attr(val, encoded):
+    # Store values as JSON when they survive a round trip, otherwise
+    # fall back on the original YAML.
+    if _json_safe(val):
+        return {"v": val}
+    return {"yaml": encoded}
+
+
+def _json_safe(val):
+    if val is None or isinstance(val, (bool, int, float, str)):
+        return True
+    if isinstance(val, list):
+        return all(_json_safe(x) for x in val)
+    if isinstance(val, dict):
+        return all(isinstance(key, str) and _json_safe(x) for key, x in val.items())
+    return False
+
+
+def _decode_attrs(encoded):
+    return {
+        name: yaml_util.fast_safe_load(val["yaml"]) if "yaml" in val else val["v"]
+        for name, val in json.loads(encoded).items()
+    }
+
+
+def _decode_markers(encoded):
+    return frozenset(encoded.split(",")) if encoded else frozenset()
+
+
+def runs(root):
+    """Returns runs under `root` using the default catalog.
+
+    Returns None if the catalog cannot be used.
+    """
+    return _apply_catalog(lambda catalog: catalog.runs(root))
+
+
+def runs_with_mtimes(root):
+    """Returns runs and their mtimes under `root` using the default catalog.
+
+    Returns None if the catalog cannot be used.
+    """
+    return _apply_catalog(lambda catalog: catalog.runs_with_mtimes(root))
+
+
+def _apply_catalog(f):
+    try:
+        catalog = RunCatalog()
+    except (OSError, sqlite3.Error) as e:
+        log.warning("cannot open run catalog: %s", e)
+        return None
+    try:
+        return f(catalog)
+    except sqlite3.DatabaseError as e:
+        log.warning("cannot read run catalog: %s", e)
+        return None
+    finally:
+        catalog.close()
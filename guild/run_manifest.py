@@ -20,16 +20,17 @@ from guild import util
 from guild import var
 
 
-def sourcecode_args(run_file, run_dir, project_file, project_dir):
+def sourcecode_args(run_file, run_dir, project_file, project_dir, sha1=None):
     """Returns manifest args for a source code file.
 
     Args:
 
         ['s', run_relative_path, sha1, project_relative_path]
 
+    If `sha1` isn't specified, it's read from `run_file`.
     """
     dest_arg = _relpath(run_file, run_dir)
-    hash_arg = util.file_sha1(run_file)
+    hash_arg = sha1 or util.file_sha1(run_file)
     src_arg = _relpath(project_file, project_dir)
     return ["s", dest_arg, hash_arg, src_arg]
 
@@ -26,6 +26,7 @@ from guild import opref as opreflib
 from guild import resolver
 from guild import run as runlib
 from guild import run_manifest
+from guild import sourcecode_store
 from guild import util
 from guild import var
 
@@ -532,58 +533,33 @@ def export_runs(runs, dest, move=False, copy_resources=False, quiet=False):
 
 
 def _export_runs_to_zip(runs, filename, move, copy_resources, quiet):
-    import zipfile
+    from guild import run_zip_export
 
-    tmp_dir = util.mktempdir("guild-export-")
-    tmp_zip = os.path.join(tmp_dir, "export.zip")
-    log.debug("writing zip %s", tmp_zip)
+    log.debug("writing zip %s", filename)
     exported = []
-    with zipfile.ZipFile(tmp_zip, "w", allowZip64=True) as zf:
-        existing = set()
-        if os.path.exists(filename):
-            try:
-                _write_zip_files(filename, zf, existing)
-            except zipfile.BadZipfile as e:
-                raise RunsExportError(f"cannot write to {filename}: {e}") from e
-        _copy_runs_to_zip(runs, move, copy_resources, zf, existing, quiet, exported)
-    log.debug("replacing %s with %s", filename, tmp_zip)
-    shutil.move(tmp_zip, filename)
+    try:
+        with run_zip_export.ZipExport(filename) as export:
+            _copy_runs_to_zip(runs, move, copy_resources, export, quiet, exported)
+    except run_zip_export.ExportError as e:
+        raise RunsExportError(e.args[0]) from e
     if move:
         _delete_exported_runs(exported)
     return exported
 
 
-def _write_zip_files(src, zf, written):
-    import zipfile
-
-    with zipfile.ZipFile(src, "r") as src_zf:
-        for name in src_zf.namelist():
-            info = src_zf.getinfo(name)
-            data = src_zf.read(name)
-            zf.writestr(info, data, zipfile.ZIP_DEFLATED)
-            written.add(name)
-
-
-def _copy_runs_to_zip(runs, move, copy_resources, zf, existing, quiet, written):
-    import zipfile
-
+def _copy_runs_to_zip(runs, move, copy_resources, export, quiet, written):
     action_desc = "Moving" if move else "Copying"
     for run in runs:
-        if _zip_path(run.id, "") in existing:
+        if run.id in export.resumed_runs:
+            log.debug("%s exported before resume", run.id)
+            written.append(run)
+            continue
+        if _zip_path(run.id, "") in export.existing:
             log.warning("%s exists, skipping", run.id)
             continue
         if not quiet:
             log.info("%s %s", action_desc, run.id)
-        for src, zip_path in _iter_run_files_for_zip(run, copy_resources):
-            log.debug("writing %s to %s", src, zip_path)
-            if zip_path in existing:
-                log.error(
-                    "unexpected run file %s in %s, skipping",
-                    zip_path,
-                    zf.filename,
-                )
-                continue
-            zf.write(src, zip_path, zipfile.ZIP_DEFLATED)
+        export.write_run(run.id, _iter_run_files_for_zip(run, copy_resources))
         written.append(run)
 
 
@@ -734,7 +710,7 @@ def run_for_id(id, runs_dir=None):
     return runlib.Run(id, os.path.join(runs_dir, id))
 
 
-def sourcecode_digest(run):
+def sourcecode_digest(run, hash_cache=None):
     """Returns the source code digest for a run.
 
     Uses `file_util.files_digest()` with a lexicographic ordering of
@@ -742,11 +718,39 @@ def sourcecode_digest(run):
     use `natsort`, which is used elsewhere in Guild for user
     presentation. `natsort` is not needed for this application and
     makes cross-language digest implementations harder to implement.
+
+    Digests are cached using the source code paths and their sha1
+    hashes, which are read from the run manifest. Use `hash_cache` to
+    share a cache when calculating digests for more than one run. If
+    not specified, a cache is opened and closed for the run.
     """
-    files = sourcecode_files(run)
+    files = sorted(_sourcecode_file_hashes(run))
     if not files:
         return None
-    return file_util.files_digest(sorted(files), run.dir)
+    if hash_cache:
+        return _sourcecode_digest(run, files, hash_cache)
+    hash_cache = sourcecode_store.HashCache()
+    try:
+        return _sourcecode_digest(run, files, hash_cache)
+    finally:
+        hash_cache.close()
+
+
+def _sourcecode_digest(run, files, hash_cache):
+    key = sourcecode_store.digest_key(files)
+    digest = hash_cache.digest(key)
+    if digest is None:
+        digest = file_util.files_digest([path for path, _sha1 in files], run.dir)
+        hash_cache.set_digest(key, digest)
+    return digest
+
+
+def _sourcecode_file_hashes(run):
+    manifest_path = run_manifest.run_manifest_path(run.dir)
+    if not os.path.exists(manifest_path):
+        return []
+    with run_manifest.manifest_for_run(run.dir) as m:
+        return [(entry[1], entry[2]) for entry in m if entry[0] == "s"]
 
 
 def stop_run(run_pid, force=False, timeout=None):
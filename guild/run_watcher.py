@@ -0,0 +1,321 @@
+# Copyright 2017-2023 Posit Software, PBC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Watches a runs directory for run changes.
+
+On Linux, changes are detected using inotify. Each run `.guild`
+directory is watched for added, deleted, and touched files, which
+includes run markers like `STAGED` and `PENDING`. Each run
+`.guild/attrs` directory is watched for written and deleted attrs
+(e.g. tags). The runs directory is watched for added and deleted runs.
+
+On other platforms, or when inotify can't be used, the watcher falls
+back to polling: `changed()` returns None, which means that any run
+may have changed, and callers are only woken by their poll interval.
+
+Set `NO_RUNS_WATCHER=1` to disable inotify.
+"""
+
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+
+from guild import util
+
+log = logging.getLogger("guild")
+
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+ROOT_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_ONLYDIR
+RUN_MASK = IN_CREATE | IN_ONLYDIR
+RUN_GUILD_MASK = (
+    IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_ATTRIB | IN_ONLYDIR
+)
+RUN_ATTRS_MASK = IN_CLOSE_WRITE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_ONLYDIR
+
+EVENT_HEADER = struct.Struct("iIII")
+
+READ_TIMEOUT = 1.0
+
+
+class RunsWatcher:
+    """Watches a runs directory for changes.
+
+    `on_change` is called from a watcher thread when a run changes.
+
+    Call `start()` to start watching. Use `changed()` to get the IDs of
+    runs that changed since the last call.
+    """
+    def __init__(self, root, on_change=None):
+        self.root = root
+        self.on_change = on_change
+        self._inotify = None
+        self._changed = set()
+        self._all_changed = True
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def active(self):
+        return self._inotify is not None
+
+    def start(self):
+        """Starts the watcher.
+
+        Returns True if the watcher uses inotify to detect changes,
+        otherwise returns False.
+        """
+        inotify = _init_inotify()
+        if not inotify:
+            return False
+        watches = _Watches(inotify, self.root)
+        try:
+            watches.init()
+        except OSError as e:
+            inotify.close()
+            _log_watch_error(self.root, e)
+            return False
+        self._inotify = inotify
+        self._thread = threading.Thread(
+            target=self._watch, args=(inotify, watches), daemon=True
+        )
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def changed(self):
+        """Returns IDs of runs that changed since the last call.
+
+        Returns None if any run may have changed. This is the case on
+        the first call, when the watcher isn't active, and when
+        events are lost.
+        """
+        with self._lock:
+            if self._all_changed or not self.active:
+                self._all_changed = False
+                self._changed.clear()
+                return None
+            changed = self._changed
+            self._changed = set()
+            return changed
+
+    def _watch(self, inotify, watches):
+        try:
+            while not self._stop.is_set():
+                changed = watches.read(READ_TIMEOUT)
+                if changed or changed is None:
+                    self._handle_changed(changed)
+        except OSError as e:
+            _log_watch_error(self.root, e)
+            self._fail()
+        finally:
+            inotify.close()
+
+    def _handle_changed(self, changed):
+        with self._lock:
+            if changed is None:
+                self._all_changed = True
+            else:
+                self._changed.update(changed)
+        if self.on_change:
+            self.on_change()
+
+    def _fail(self):
+        with self._lock:
+            self._inotify = None
+            self._all_changed = True
+        if self.on_change:
+            self.on_change()
+
+
+def _log_watch_error(root, e):
+    if e.errno == errno.ENOSPC:
+        log.warning(
+            "inotify watch limit reached for %s - polling for changes "
+            "(increase fs.inotify.max_user_watches to avoid this)",
+            root,
+        )
+    else:
+        log.warning("error watching %s (%s) - polling for changes", root, e)
+
+
+def _init_inotify():
+    if os.getenv("NO_RUNS_WATCHER") == "1":
+        return None
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        return _Inotify()
+    except OSError as e:
+        log.debug("inotify not available: %s", e)
+        return None
+
+
+class _Inotify:
+    """Minimal inotify interface using libc."""
+    def __init__(self):
+        import ctypes
+
+        libc = ctypes.CDLL(None, use_errno=True)
+        try:
+            self._add_watch = libc.inotify_add_watch
+            self._rm_watch = libc.inotify_rm_watch
+            init = libc.inotify_init1
+        except AttributeError as e:
+            raise OSError(errno.ENOSYS, "inotify not supported") from e
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._get_errno = ctypes.get_errno
+        self.fd = init(IN_CLOEXEC | IN_NONBLOCK)
+        if self.fd < 0:
+            raise self._error()
+        self._closed = False
+
+    def add_watch(self, path, mask):
+        wd = self._add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise self._error(path)
+        return wd
+
+    def rm_watch(self, wd):
+        # Failure is ignored - the watch is removed with its directory.
+        self._rm_watch(self.fd, wd)
+
+    def _error(self, path=None):
+        err = self._get_errno()
+        return OSError(err, os.strerror(err), path)
+
+    def read(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+        return list(_iter_events(data))
+
+    def close(self):
+        if not self._closed:
+            os.close(self.fd)
+            self._closed = True
+
+
+def _iter_events(data):
+    pos = 0
+    while pos < len(data):
+        wd, mask, _cookie, name_len = EVENT_HEADER.unpack_from(data, pos)
+        pos += EVENT_HEADER.size
+        name = data[pos:pos + name_len].rstrip(b"\0")
+        pos += name_len
+        yield wd, mask, os.fsdecode(name)
+
+
+class _Watches:
+    """Inotify watches for a runs directory.
+
+    A run is watched using its `.guild` and `.guild/attrs`
+    directories. A run without a `.guild` directory is watched until
+    the directory is created.
+
+    Watches are mapped to tuples of run ID and the watched run
+    subdirectory.
+    """
+    def __init__(self, inotify, root):
+        self.inotify = inotify
+        self.root = root
+        self._root_wd = None
+        self._runs = {}
+
+    def init(self):
+        self._root_wd = self.inotify.add_watch(self.root, ROOT_MASK)
+        for name in util.safe_listdir(self.root):
+            self._watch_run(name)
+
+    def _watch_run(self, name):
+        if not self._try_watch(name, ".guild", RUN_GUILD_MASK):
+            self._try_watch(name, "", RUN_MASK)
+            return
+        self._try_watch(name, os.path.join(".guild", "attrs"), RUN_ATTRS_MASK)
+
+    def _try_watch(self, name, subdir, mask):
+        path = os.path.join(self.root, name, subdir)
+        try:
+            wd = self.inotify.add_watch(path, mask)
+        except OSError as e:
+            if e.errno not in (errno.ENOENT, errno.ENOTDIR):
+                raise
+            return False
+        else:
+            self._runs[wd] = name, subdir
+            return True
+
+    def read(self, timeout):
+        """Returns a set of changed run IDs.
+
+        Returns None if events were lost.
+        """
+        changed = set()
+        for wd, mask, name in self.inotify.read(timeout):
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if wd == self._root_wd:
+                self._handle_root_event(mask, name, changed)
+            else:
+                self._handle_run_event(wd, mask, name, changed)
+        return changed
+
+    def _handle_root_event(self, mask, name, changed):
+        if mask & (IN_CREATE | IN_MOVED_TO) and mask & IN_ISDIR:
+            self._watch_run(name)
+        changed.add(name)
+
+    def _handle_run_event(self, wd, mask, name, changed):
+        try:
+            run_id, subdir = self._runs[wd]
+        except KeyError:
+            return
+        if mask & IN_IGNORED:
+            # Watch was removed because the directory was deleted.
+            del self._runs[wd]
+        elif not subdir and name == ".guild" and mask & IN_CREATE:
+            # Watch the new `.guild` directory in place of the run
+            # directory.
+            del self._runs[wd]
+            self.inotify.rm_watch(wd)
+            self._watch_run(run_id)
+        elif subdir == ".guild" and name == "attrs" and mask & IN_CREATE:
+            self._try_watch(run_id, os.path.join(".guild", "attrs"), RUN_ATTRS_MASK)
+        changed.add(run_id)
@@ -0,0 +1,411 @@
+# Copyright 2017-2023 Posit Software, PBC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Export runs to zip archives.
+
+Runs are written to a partial archive alongside the destination,
+which replaces the destination when all runs are written. An existing
+destination archive is cloned to the partial archive (see
+`sourcecode_store.FileCloner`) and new runs are appended to it, so
+existing entries aren't decompressed or compressed again.
+
+Progress is saved to a checkpoint file as each run is written. If an
+export is interrupted, a subsequent export to the same destination
+resumes from the last written run.
+
+Files are compressed in parallel. Files with extensions in
+`STORED_EXTENSIONS` are already compressed and are stored without
+compression. Files larger than `STREAM_FILE_SIZE` are split into
+chunks of `COMPRESS_CHUNK_SIZE`, which are compressed in parallel and
+written to the archive as a single deflate stream. Each chunk is
+primed with the preceding `DEFLATE_WINDOW_SIZE` bytes of the file so
+chunking has little effect on compression.
+
+Python's `zipfile` module doesn't support writing compressed data
+directly so entries are written using `ZipFile` internals (see
+`_start_entry()` and `_finish_entry()`). These are tested in
+`guild/tests/run-zip-export.md`.
+"""
+
+import concurrent.futures
+import json
+import logging
+import os
+import zipfile
+import zlib
+
+from guild import sourcecode_store
+from guild import util
+
+log = logging.getLogger("guild")
+
+CHECKPOINT_VERSION = 1
+
+READ_BUF_SIZE = 1024 * 1024
+
+STREAM_FILE_SIZE = 8 * 1024 * 1024
+
+COMPRESS_CHUNK_SIZE = 1024 * 1024
+
+DEFLATE_WINDOW_SIZE = 32 * 1024
+
+STORED_EXTENSIONS = {
+    ".7z",
+    ".avi",
+    ".bz2",
+    ".ckpt",
+    ".gif",
+    ".gz",
+    ".jpeg",
+    ".jpg",
+    ".mkv",
+    ".mov",
+    ".mp3",
+    ".mp4",
+    ".npz",
+    ".parquet",
+    ".png",
+    ".pt",
+    ".pth",
+    ".tgz",
+    ".webp",
+    ".whl",
+    ".xz",
+    ".zip",
+    ".zst",
+}
+
+_ZIP_INFO_ATTRS = [
+    "filename",
+    "date_time",
+    "compress_type",
+    "create_system",
+    "create_version",
+    "extract_version",
+    "reserved",
+    "flag_bits",
+    "volume",
+    "internal_attr",
+    "external_attr",
+    "header_offset",
+    "CRC",
+    "compress_size",
+    "file_size",
+]
+
+
+class ExportError(Exception):
+    pass
+
+
+class ZipExport:
+    """Writes runs to a zip archive.
+
+    Use as a context manager. Call `write_run()` for each run. The
+    destination is replaced when the context exits without error.
+    """
+    def __init__(self, filename, workers=None):
+        self.filename = filename
+        self.partial = filename + ".partial"
+        self.checkpoint = filename + ".partial.checkpoint"
+        self.workers = workers or os.cpu_count() or 1
+        self.existing = set()
+        self.resumed_runs = []
+        self._f = None
+        self._zf = None
+
+    def __enter__(self):
+        entries, end = self._init_partial()
+        self._f = open(self.partial, "r+b")
+        self._f.truncate(end)
+        self._f.seek(end)
+        self._zf = zipfile.ZipFile(self._f, "w", allowZip64=True)
+        for info in entries:
+            self._zf.filelist.append(info)
+            self._zf.NameToInfo[info.filename] = info
+            self.existing.add(info.filename)
+        return self
+
+    def _init_partial(self):
+        resumed = self._try_resume()
+        if resumed:
+            return resumed
+        util.ensure_deleted(self.partial)
+        util.ensure_deleted(self.checkpoint)
+        if os.path.exists(self.filename):
+            entries, end = _zip_entries(self.filename)
+            cloner = sourcecode_store.FileCloner(hardlinks=False)
+            cloner.clone(self.filename, self.partial)
+        else:
+            entries, end = [], 0
+            util.touch(self.partial)
+        self._write_checkpoint(None, entries, end)
+        return entries, end
+
+    def _try_resume(self):
+        if not os.path.exists(self.partial):
+            return None
+        try:
+            records = _read_checkpoint(self.checkpoint)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.debug("cannot resume export from %s: %s", self.checkpoint, e)
+            return None
+        if not records or records[-1]["end"] > os.path.getsize(self.partial):
+            log.debug("invalid checkpoint %s", self.checkpoint)
+            return None
+        self.resumed_runs = [r["run"] for r in records if r["run"]]
+        if self.resumed_runs:
+            log.info(
+                "Resuming export to %s (%i run(s) already exported)",
+                self.filename,
+                len(self.resumed_runs),
+            )
+        entries = [_zip_info_for_data(data) for r in records for data in r["entries"]]
+        return entries, records[-1]["end"]
+
+    def _write_checkpoint(self, run_id, entries, end):
+        record = {
+            "version": CHECKPOINT_VERSION,
+            "run": run_id,
+            "end": end,
+            "entries": [_zip_info_data(info) for info in entries],
+        }
+        with open(self.checkpoint, "a") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def __exit__(self, exc_type, *_exc):
+        if exc_type:
+            # Leave partial archive and checkpoint to resume. Clear
+            # the zip file handle so it doesn't write a central
+            # directory when it's closed.
+            self._zf.fp = None
+            self._f.close()
+            return
+        self._zf.close()
+        self._f.close()
+        os.replace(self.partial, self.filename)
+        util.ensure_deleted(self.checkpoint)
+
+    def write_run(self, run_id, files):
+        """Writes run files to the archive.
+
+        `files` is an iterable of `(src, zip_path)` tuples.
+
+        Progress is checkpointed when the run is written.
+        """
+        start = len(self._zf.filelist)
+        max_pending = self.workers * 2
+        pending = []
+        with concurrent.futures.ThreadPoolExecutor(self.workers) as executor:
+            for src, zip_path in files:
+                if zip_path in self.existing:
+                    log.error(
+                        "unexpected run file %s in %s, skipping",
+                        zip_path,
+                        self.filename,
+                    )
+                    continue
+                if _compress_in_memory(src):
+                    pending.append(executor.submit(_compressed_entry, src, zip_path))
+                    if len(pending) >= max_pending:
+                        self._write_compressed(pending.pop(0).result())
+                elif _compress_in_chunks(src):
+                    self._flush_pending(pending)
+                    self._write_chunked(executor, max_pending, src, zip_path)
+                else:
+                    self._flush_pending(pending)
+                    self._write_file(src, zip_path)
+            self._flush_pending(pending)
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._write_checkpoint(run_id, self._zf.filelist[start:], self._zf.start_dir)
+
+    def _flush_pending(self, pending):
+        for future in pending:
+            self._write_compressed(future.result())
+        del pending[:]
+
+    def _write_file(self, src, zip_path):
+        log.debug("writing %s to %s", src, zip_path)
+        compress_type = (
+            zipfile.ZIP_STORED if _is_stored(src) else zipfile.ZIP_DEFLATED
+        )
+        self._zf.write(src, zip_path, compress_type)
+
+    def _write_compressed(self, entry):
+        info, data = entry
+        log.debug("writing %s", info.filename)
+        self._start_entry(info)
+        self._f.write(data)
+        self._finish_entry(info)
+
+    def _write_chunked(self, executor, max_pending, src, zip_path):
+        log.debug("writing %s to %s in chunks", src, zip_path)
+        info = zipfile.ZipInfo.from_file(src, zip_path)
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.CRC = 0
+        info.compress_size = 0
+        zip64 = info.file_size * 1.05 > zipfile.ZIP64_LIMIT
+        self._start_entry(info, zip64)
+        crc = 0
+        file_size = 0
+        compress_size = 0
+        pending = []
+        for offset, last in _chunk_offsets(info.file_size):
+            pending.append(executor.submit(_compressed_chunk, src, offset, last))
+            if len(pending) >= max_pending or last:
+                while pending:
+                    buf, data = pending.pop(0).result()
+                    crc = zlib.crc32(buf, crc)
+                    file_size += len(buf)
+                    compress_size += len(data)
+                    self._f.write(data)
+        info.CRC = crc
+        info.file_size = file_size
+        info.compress_size = compress_size
+        # Rewrite the header with the checksum and sizes
+        end = self._f.tell()
+        self._f.seek(info.header_offset)
+        self._f.write(info.FileHeader(zip64))
+        self._f.seek(end)
+        self._finish_entry(info)
+
+    def _start_entry(self, info, zip64=False):
+        """Writes the local header for a new archive entry.
+
+        Entry data is written to `self._f` after the header. Call
+        `_finish_entry()` when the data is written.
+        """
+        zf = self._zf
+        zf._writecheck(info)  # pylint: disable=protected-access
+        zf._didModify = True  # pylint: disable=protected-access
+        self._f.seek(zf.start_dir)
+        info.header_offset = self._f.tell()
+        self._f.write(info.FileHeader(zip64))
+
+    def _finish_entry(self, info):
+        zf = self._zf
+        zf.start_dir = self._f.tell()
+        zf.filelist.append(info)
+        zf.NameToInfo[info.filename] = info
+
+
+def _zip_entries(filename):
+    try:
+        with zipfile.ZipFile(filename, "r") as zf:
+            return zf.infolist(), zf.start_dir
+    except zipfile.BadZipfile as e:
+        raise ExportError(f"cannot write to {filename}: {e}") from e
+
+
+def _read_checkpoint(path):
+    records = []
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Partially written record
+                break
+            if record["version"] != CHECKPOINT_VERSION:
+                raise ValueError(f"unsupported checkpoint version {record['version']}")
+            records.append(record)
+    return records
+
+
+def _zip_info_data(info):
+    data = {name: getattr(info, name) for name in _ZIP_INFO_ATTRS}
+    data["extra"] = info.extra.hex()
+    data["comment"] = info.comment.hex()
+    return data
+
+
+def _zip_info_for_data(data):
+    info = zipfile.ZipInfo(data["filename"], tuple(data["date_time"]))
+    for name in _ZIP_INFO_ATTRS[2:]:
+        setattr(info, name, data[name])
+    info.extra = bytes.fromhex(data["extra"])
+    info.comment = bytes.fromhex(data["comment"])
+    return info
+
+
+def _is_stored(path):
+    return os.path.splitext(path)[1].lower() in STORED_EXTENSIONS
+
+
+def _compress_in_memory(src):
+    return (
+        os.path.isfile(src)  #
+        and not _is_stored(src)  #
+        and os.path.getsize(src) <= STREAM_FILE_SIZE
+    )
+
+
+def _compress_in_chunks(src):
+    return (
+        os.path.isfile(src)  #
+        and not _is_stored(src)  #
+        and os.path.getsize(src) > STREAM_FILE_SIZE
+    )
+
+
+def _chunk_offsets(file_size):
+    offsets = range(0, max(file_size, 1), COMPRESS_CHUNK_SIZE)
+    return [(offset, offset == offsets[-1]) for offset in offsets]
+
+
+def _compressed_chunk(src, offset, last):
+    """Returns a tuple of chunk data and compressed data.
+
+    Compressed data for the last chunk ends the deflate stream. Data
+    for other chunks is flushed to a byte boundary so that chunks can
+    be concatenated.
+    """
+    with open(src, "rb") as f:
+        dict_offset = max(0, offset - DEFLATE_WINDOW_SIZE)
+        f.seek(dict_offset)
+        zdict = f.read(offset - dict_offset)
+        buf = f.read(COMPRESS_CHUNK_SIZE)
+    compress_kw = {"zdict": zdict} if zdict else {}
+    compressor = zlib.compressobj(
+        zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15, **compress_kw
+    )
+    data = compressor.compress(buf)
+    data += compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+    return buf, data
+
+
+def _compressed_entry(src, zip_path):
+    info = zipfile.ZipInfo.from_file(src, zip_path)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    crc = 0
+    size = 0
+    chunks = []
+    with open(src, "rb") as f:
+        while True:
+            buf = f.read(READ_BUF_SIZE)
+            if not buf:
+                break
+            crc = zlib.crc32(buf, crc)
+            size += len(buf)
+            chunks.append(compressor.compress(buf))
+    chunks.append(compressor.flush())
+    data = b"".join(chunks)
+    info.CRC = crc
+    info.file_size = size
+    info.compress_size = len(data)
+    return info, data
@@ -45,6 +45,8 @@ STEP_USED_PARAMS = (
     "force_sourcecode",
     "gpus",
     "label",
+    "max_parallel",
+    "max_parallel_steps",
     "max_trials",
     "maximize",
     "minimize",
@@ -83,6 +85,7 @@ class Step:
         self.name = data.get("name") or opspec_param
         self.batch_files, flag_args = _split_batch_files(params["flags"])
         self.checks = _init_checks(data)
+        self.needs = _init_needs(data)
         self.isolate_runs = bool(data.get("isolate-runs", True))
         # Standard run params
         self.batch_label = params["batch_label"]
@@ -93,6 +96,8 @@ class Step:
         self.force_sourcecode = params["force_sourcecode"]
         self.gpus = _resolve_refs(params["gpus"], parent_flags)
         self.label = _resolve_refs(params["label"], parent_flags)
+        self.max_parallel = params["max_parallel"]
+        self.max_parallel_steps = params["max_parallel_steps"]
         self.max_trials = params["max_trials"]
         self.maximize = params["maximize"]
         self.minimize = params["minimize"]
@@ -266,6 +271,25 @@ def _resolve_refs(val, flags):
     return str(resolved)
 
 
+def _init_needs(data):
+    """Returns the list of step names that a step needs.
+
+    Returns None if the step doesn't specify `needs`, in which case
+    it needs the previous step.
+    """
+    try:
+        needs = data["needs"]
+    except KeyError:
+        return None
+    if needs is None:
+        return []
+    if isinstance(needs, str):
+        return [needs]
+    if not isinstance(needs, list):
+        _error(f"invalid needs {needs!r} for step {data!r}: expected a list")
+    return [str(name) for name in needs]
+
+
 def _init_checks(data):
     expect = data.get("expect") or []
     if not isinstance(expect, list):
@@ -304,8 +328,21 @@ def _run_steps():
     if not steps:
         log.warning("no steps defined for run %s", parent_run.id)
         return
-    for step, step_name in _iter_steps_with_names(steps):
-        _handle_run_step(parent_run, step, step_name)
+    steps_with_names = list(_iter_steps_with_names(steps))
+    step_needs = _step_needs(steps_with_names)
+    max_parallel = _max_parallel_steps(parent_run)
+    if max_parallel > 1:
+        _run_steps_parallel(parent_run, steps_with_names, step_needs, max_parallel)
+    else:
+        for step, step_name in steps_with_names:
+            _handle_run_step(parent_run, step, step_name)
+
+
+def _max_parallel_steps(parent_run):
+    # Steps concurrency is separate from `max_parallel`, which applies
+    # to batch trials and is inherited by trials from the batch proto.
+    params = parent_run.get("run_params") or {}
+    return params.get("max_parallel_steps") or 1
 
 
 def _iter_steps_with_names(steps):
@@ -330,12 +367,90 @@ def _step_name_for_count(step_name, count):
     return step_name if count == 0 else f"{step_name}_{count + 1}"
 
 
+def _step_needs(steps_with_names):
+    """Returns a dict of step names to the names of steps they need.
+
+    A step that doesn't specify `needs` needs the previous step. A
+    step may only need steps that are defined before it.
+    """
+    step_needs = {}
+    prev_name = None
+    for step, step_name in steps_with_names:
+        if step.needs is None:
+            needs = [prev_name] if prev_name else []
+        else:
+            needs = step.needs
+            for name in needs:
+                if name not in step_needs:
+                    _error(
+                        f"invalid needs for step '{step_name}': '{name}' must "
+                        "be the name of a previous step"
+                    )
+        step_needs[step_name] = set(needs)
+        prev_name = step_name
+    return step_needs
+
+
 def _handle_run_step(parent_run, step, step_name):
     step_run_dir = _resolve_step_run_dir(parent_run, step_name)
     _run_step(step, parent_run, step_run_dir)
     _run_step_checks(step, step_run_dir)
 
 
+def _run_steps_parallel(parent_run, steps_with_names, step_needs, max_parallel):
+    """Runs up to `max_parallel` steps at a time.
+
+    A step is started when the steps it needs are completed and their
+    checks pass. If a step fails, no further steps are started and the
+    operation exits with the step error once running steps finish.
+    """
+    from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+    pending = list(steps_with_names)
+    completed = set()
+    running = {}
+    error = None
+    with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+        while True:
+            while error is None and len(running) < max_parallel:
+                ready = _next_ready_step(pending, step_needs, completed)
+                if not ready:
+                    break
+                pending.remove(ready)
+                step, step_name = ready
+                step_run_dir = _resolve_step_run_dir(parent_run, step_name)
+                cmd, env, cwd = _init_step_call(step, parent_run, step_run_dir)
+                future = executor.submit(subprocess.call, cmd, env=env, cwd=cwd)
+                running[future] = step, step_name, step_run_dir
+            if not running:
+                break
+            done, _pending = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step, step_name, step_run_dir = running.pop(future)
+                try:
+                    _handle_step_returncode(future.result())
+                    _run_step_checks(step, step_run_dir)
+                except SystemExit as e:
+                    error = error or e
+                else:
+                    completed.add(step_name)
+    if error:
+        raise error
+    if pending:
+        _internal_error(f"unable to run steps: {_steps_desc(pending)}")
+
+
+def _next_ready_step(pending, step_needs, completed):
+    for step, step_name in pending:
+        if step_needs[step_name] <= completed:
+            return step, step_name
+    return None
+
+
+def _steps_desc(steps_with_names):
+    return ", ".join(step_name for _step, step_name in steps_with_names)
+
+
 def _resolve_step_run_dir(parent_run, step_name):
     """Returns a resolved step run directory path.
 
@@ -448,11 +563,19 @@ def _init_steps(run):
 
 
 def _run_step(step, parent_run, step_run_dir):
+    cmd, env, cwd = _init_step_call(step, parent_run, step_run_dir)
+    _handle_step_returncode(subprocess.call(cmd, env=env, cwd=cwd))
+
+
+def _init_step_call(step, parent_run, step_run_dir):
     cmd = _step_run_cmd(step, step_run_dir, parent_run)
     env = _step_run_env(step, parent_run)
     cwd = _step_run_cwd()
     _log_step_details(step_run_dir, step, cmd, env, cwd)
-    returncode = subprocess.call(cmd, env=env, cwd=cwd)
+    return cmd, env, cwd
+
+
+def _handle_step_returncode(returncode):
     if returncode != 0:
         sys.exit(returncode)
 
@@ -552,6 +675,10 @@ def _step_run_step_config_args(step):
         args.extend(["--gpus", str(step.gpus)])
     if step.label:
         args.extend(["--label", step.label])
+    if step.max_parallel:
+        args.extend(["--max-parallel", str(step.max_parallel)])
+    if step.max_parallel_steps:
+        args.extend(["--max-parallel-steps", str(step.max_parallel_steps)])
     if step.max_trials:
         args.extend(["--max-trials", str(step.max_trials)])
     if step.maximize:
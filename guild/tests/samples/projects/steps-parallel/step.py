@@ -0,0 +1,11 @@
+import time
+
+name = ""
+fail = False
+
+time.sleep(1)
+
+if fail:
+    raise SystemExit(f"{name} failed")
+
+print(name)
@@ -0,0 +1,191 @@
+"""Stand-in for the AWS CLI that stores S3 objects in a local directory.
+
+Supports the subset of `aws s3` and `aws s3api` commands used by the
+S3 remote. Buckets are directories under `FAKE_S3_DIR`.
+
+If `FAKE_S3_LOG` is set, commands are appended to the file, one line
+per command. If `FAKE_S3_DELAY` is set, `sync` commands sleep for the
+specified number of seconds to simulate transfer latency. `sync`
+commands fail if their source path contains any of the space separated
+values in `FAKE_S3_FAIL`.
+"""
+
+import fnmatch
+import json
+import os
+import shutil
+import sys
+import time
+
+
+def main(args):
+    _log_cmd(args)
+    args = _strip_region(args)
+    if args[:1] == ["s3"]:
+        _s3(args[1], args[2:])
+    elif args[:1] == ["s3api"]:
+        _s3api(args[1], args[2:])
+    else:
+        _error(f"unsupported command: {args}")
+
+
+def _log_cmd(args):
+    log_path = os.getenv("FAKE_S3_LOG")
+    if log_path:
+        with open(log_path, "a") as f:
+            f.write(" ".join(args) + "\n")
+
+
+def _strip_region(args):
+    if args[:1] == ["--region"]:
+        return args[2:]
+    return args
+
+
+def _s3(cmd, args):
+    opts, paths, filters = _parse_s3_args(args)
+    if cmd == "sync":
+        _sync(paths[0], paths[1], filters, "--delete" in opts)
+    elif cmd == "rm":
+        _rmtree(_local_path(paths[0]))
+    elif cmd == "mv":
+        src, dest = [_local_path(path) for path in paths]
+        _rmtree(dest)
+        _ensure_dir(os.path.dirname(dest))
+        shutil.move(src, dest)
+    elif cmd == "mb":
+        _ensure_dir(_local_path(paths[0]))
+    elif cmd == "rb":
+        _rmtree(_local_path(paths[0]))
+    else:
+        _error(f"unsupported s3 command: {cmd}")
+
+
+def _parse_s3_args(args):
+    opts, paths, filters = [], [], []
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        if arg in ("--exclude", "--include"):
+            filters.append((arg == "--include", args.pop(0)))
+        elif arg.startswith("--"):
+            opts.append(arg)
+        else:
+            paths.append(arg)
+    return opts, paths, filters
+
+
+def _sync(src, dest, filters, delete):
+    delay = os.getenv("FAKE_S3_DELAY")
+    if delay:
+        time.sleep(float(delay))
+    for val in os.getenv("FAKE_S3_FAIL", "").split():
+        if val in src:
+            _error(f"upload failed: {src}")
+    src_dir, dest_dir = _local_path(src), _local_path(dest)
+    src_files = set(_filtered(_files(src_dir), filters))
+    for path in sorted(src_files):
+        dest_path = os.path.join(dest_dir, path)
+        _ensure_dir(os.path.dirname(dest_path))
+        shutil.copy2(os.path.join(src_dir, path), dest_path)
+    if delete:
+        for path in _filtered(_files(dest_dir), filters):
+            if path not in src_files:
+                os.remove(os.path.join(dest_dir, path))
+
+
+def _files(dir):
+    for root, _dirs, files in os.walk(dir):
+        for name in files:
+            yield os.path.relpath(os.path.join(root, name), dir)
+
+
+def _filtered(paths, filters):
+    for path in paths:
+        included = True
+        for include, pattern in filters:
+            if fnmatch.fnmatch(path, pattern):
+                included = include
+        if included:
+            yield path
+
+
+def _s3api(cmd, args):
+    opts = _parse_s3api_args(args)
+    if cmd == "get-object":
+        src = os.path.join(_bucket_dir(opts["--bucket"]), opts["--key"])
+        if not os.path.exists(src):
+            _error("An error occurred (NoSuchKey) when calling the GetObject operation")
+        shutil.copyfile(src, opts["outfile"])
+    elif cmd == "put-object":
+        dest = os.path.join(_bucket_dir(opts["--bucket"]), opts["--key"])
+        _ensure_dir(os.path.dirname(dest))
+        shutil.copyfile(opts["--body"], dest)
+    elif cmd == "list-objects-v2":
+        _list_objects(opts)
+    elif cmd == "delete-objects":
+        bucket_dir = _bucket_dir(opts["--bucket"])
+        for obj in json.loads(opts["--delete"])["Objects"]:
+            path = os.path.join(bucket_dir, obj["Key"])
+            if os.path.exists(path):
+                os.remove(path)
+    elif cmd == "get-bucket-location":
+        if not os.path.exists(_bucket_dir(opts["--bucket"])):
+            _error("An error occurred (NoSuchBucket)")
+        sys.stdout.write("{}\n")
+    else:
+        _error(f"unsupported s3api command: {cmd}")
+
+
+def _list_objects(opts):
+    # Only supports listing keys as JSON (`--query Contents[].Key
+    # --output json`).
+    bucket_dir = _bucket_dir(opts["--bucket"])
+    prefix = opts.get("--prefix", "")
+    start_after = opts.get("--start-after", "")
+    keys = sorted(
+        key for key in (path.replace(os.path.sep, "/") for path in _files(bucket_dir))
+        if key.startswith(prefix) and key > start_after
+    )
+    sys.stdout.write(json.dumps(keys or None) + "\n")
+
+
+def _parse_s3api_args(args):
+    opts = {}
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        if arg.startswith("--"):
+            opts[arg] = args.pop(0)
+        else:
+            opts["outfile"] = arg
+    return opts
+
+
+def _local_path(path):
+    if not path.startswith("s3://"):
+        return path
+    bucket, _, key = path[5:].partition("/")
+    return os.path.join(_bucket_dir(bucket), key)
+
+
+def _bucket_dir(bucket):
+    return os.path.join(os.environ["FAKE_S3_DIR"], bucket)
+
+
+def _ensure_dir(path):
+    os.makedirs(path, exist_ok=True)
+
+
+def _rmtree(path):
+    if os.path.exists(path):
+        shutil.rmtree(path)
+
+
+def _error(msg):
+    sys.stderr.write(msg + "\n")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,126 @@
+"""Stand-in for AzCopy that stores blobs in a local directory.
+
+Supports the subset of `azcopy` commands used by the Azure Blob
+Storage remote. Container paths are directories under
+`FAKE_AZURE_DIR`. Absolute paths are local paths.
+
+If `FAKE_AZURE_LOG` is set, commands are appended to the file, one
+line per command.
+"""
+
+import os
+import shutil
+import sys
+
+
+def main(args):
+    _log_cmd(args)
+    cmd, opts, paths = _parse_args(args)
+    if cmd == "sync":
+        _sync(paths[0], paths[1], opts.get("--delete-destination") == "true")
+    elif cmd == "copy":
+        _copy(paths[0], paths[1])
+    elif cmd == "remove":
+        _remove(paths[0], opts.get("--include-path"))
+    elif cmd == "ls":
+        _ls(paths[0])
+    else:
+        _error(f"unsupported command: {cmd}")
+
+
+def _log_cmd(args):
+    log_path = os.getenv("FAKE_AZURE_LOG")
+    if log_path:
+        with open(log_path, "a") as f:
+            f.write(" ".join(args) + "\n")
+
+
+def _parse_args(args):
+    cmd, args = args[0], list(args[1:])
+    opts, paths = {}, []
+    while args:
+        arg = args.pop(0)
+        if arg == "--recursive":
+            opts[arg] = "true"
+        elif arg.startswith("--"):
+            opts[arg] = args.pop(0)
+        else:
+            paths.append(arg)
+    return cmd, opts, paths
+
+
+def _sync(src, dest, delete):
+    src_dir, dest_dir = _local_path(src), _local_path(dest)
+    if not os.path.isdir(src_dir):
+        _error(f"cannot sync {src}: source does not exist")
+    src_files = set(_files(src_dir))
+    for path in sorted(src_files):
+        dest_path = os.path.join(dest_dir, path)
+        _ensure_dir(os.path.dirname(dest_path))
+        shutil.copy2(os.path.join(src_dir, path), dest_path)
+    if delete:
+        for path in list(_files(dest_dir)):
+            if path not in src_files:
+                os.remove(os.path.join(dest_dir, path))
+
+
+def _copy(src, dest):
+    src_path, dest_path = _local_path(src), _local_path(dest)
+    if os.path.isdir(src_path):
+        shutil.copytree(src_path, dest_path, dirs_exist_ok=True)
+    elif os.path.exists(src_path):
+        _ensure_dir(os.path.dirname(dest_path))
+        shutil.copyfile(src_path, dest_path)
+    else:
+        _error(f"cannot copy {src}: source does not exist")
+
+
+def _remove(path, include_path):
+    local_path = _local_path(path)
+    if not include_path:
+        _rmtree(local_path)
+        return
+    for name in include_path.split(";"):
+        target = os.path.join(local_path, name)
+        if os.path.isdir(target):
+            _rmtree(target)
+        elif os.path.exists(target):
+            os.remove(target)
+
+
+def _ls(path):
+    local_path = _local_path(path)
+    if not os.path.exists(local_path):
+        _error(f"cannot list {path}: ContainerNotFound")
+    for name in sorted(_files(local_path)):
+        sys.stdout.write(f"INFO: {name}\n")
+
+
+def _files(dir):
+    for root, _dirs, files in os.walk(dir):
+        for name in files:
+            yield os.path.relpath(os.path.join(root, name), dir)
+
+
+def _local_path(path):
+    if os.path.isabs(path):
+        return path
+    return os.path.join(os.environ["FAKE_AZURE_DIR"], path)
+
+
+def _ensure_dir(path):
+    os.makedirs(path, exist_ok=True)
+
+
+def _rmtree(path):
+    if os.path.exists(path):
+        shutil.rmtree(path)
+
+
+def _error(msg):
+    sys.stderr.write(msg + "\n")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
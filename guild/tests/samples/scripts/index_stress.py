@@ -0,0 +1,33 @@
+import argparse
+import os
+
+from guild import index as indexlib
+from guild import run as runlib
+from guild.summary import SummaryWriter
+
+p = argparse.ArgumentParser()
+p.add_argument("index_dir")
+p.add_argument("runs_dir")
+p.add_argument("run_id")
+p.add_argument("--steps", type=int, default=20)
+args = p.parse_args()
+
+runs = [
+    runlib.for_dir(os.path.join(args.runs_dir, name))
+    for name in sorted(os.listdir(args.runs_dir))
+]
+[run] = [run for run in runs if run.id == args.run_id]
+
+index = indexlib.RunIndex(args.index_dir)
+
+with SummaryWriter(run.dir) as writer:
+    for step in range(args.steps):
+        writer.add_scalar("x", 1.0, step)
+        writer.flush()
+        index.refresh(runs, ["scalar"])
+        for run_ in runs:
+            index.run_scalars(run_)
+
+index.refresh(runs, ["scalar"])
+[s] = index.run_scalars(run)
+print(f"{run.id} {s['count']}")
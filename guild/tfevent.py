@@ -22,6 +22,7 @@ import glob
 import hashlib
 import logging
 import os
+import struct
 
 from guild import tensorboard_util
 
@@ -57,21 +58,467 @@ def _log_tfevent_iter_error(dir, e):
 
 
 class ScalarReader:
-    def __init__(self, dir):
+    def __init__(self, dir, check_crc=False):
         self.dir = dir
+        self.check_crc = check_crc
 
     def __iter__(self):
         """Yields (tag, val, step) for all scalars in dir."""
-        for event in EventReader(
-            self.dir,
-            lambda path: not path.endswith(".attrs"),
-        ):
-            for val in event.summary.value:
-                scalar_info = _try_scalar_event(event, val)
-                if scalar_info is not None:
+        for name in scalar_event_files(self.dir):
+            path = os.path.join(self.dir, name)
+            for scalars, _end_offset in _iter_file_scalars(path, 0, self.check_crc):
+                for scalar_info in scalars:
                     yield scalar_info
 
 
+class IncrementalScalarReader:
+    """Reads scalars appended to event files since a prior read.
+
+    `offsets` is a dict of event file names to the byte offsets where
+    reading stopped in each file. Files that aren't in `offsets` are
+    read from the start.
+
+    Reading stops at the end of the last complete record in each file
+    and `offsets` is updated as events are read. Use `offsets` after
+    iterating to resume reading later.
+    """
+    def __init__(self, dir, offsets=None, check_crc=False):
+        self.dir = dir
+        self.offsets = dict(offsets or {})
+        self.check_crc = check_crc
+
+    def can_resume(self):
+        """Returns True if events can be read incrementally.
+
+        Events can't be read incrementally if a previously read file is
+        deleted or truncated. In this case, use a reader without
+        offsets to read all events.
+        """
+        for name, offset in self.offsets.items():
+            try:
+                size = os.path.getsize(os.path.join(self.dir, name))
+            except OSError:
+                return False
+            if size < offset:
+                return False
+        return True
+
+    def __iter__(self):
+        """Yields (tag, val, step) for scalars added since last read."""
+        for name in scalar_event_files(self.dir):
+            path = os.path.join(self.dir, name)
+            offset = self.offsets.get(name, 0)
+            for scalars, end_offset in _iter_file_scalars(path, offset, self.check_crc):
+                for scalar_info in scalars:
+                    yield scalar_info
+                self.offsets[name] = end_offset
+
+
+def scalar_event_files(dir):
+    """Returns sorted names of event files in dir that may contain scalars."""
+    return sorted(
+        name for name in _safe_listdir(dir)
+        if _is_summary_event_file(name) and not _is_summary_attrs(name)
+    )
+
+
+def _safe_listdir(dir):
+    try:
+        return os.listdir(dir)
+    except OSError:
+        return []
+
+
+def _is_summary_event_file(name):
+    # See tensorboard.backend.event_processing.io_wrapper
+    return "tfevents" in name and not name.endswith(".profile-empty")
+
+
+def _iter_file_scalars(path, offset, check_crc):
+    """Yields (scalars, end_offset) for each event in path.
+
+    `scalars` is a list of (tag, val, step) tuples.
+    """
+    for data, end_offset in _iter_records(path, offset, check_crc):
+        yield _event_scalars(data, path), end_offset
+
+
+_RECORD_HEADER = struct.Struct("<QI")  # length, masked length CRC
+_RECORD_FOOTER = struct.Struct("<I")  # masked data CRC
+_READ_CHUNK_SIZE = 1024 * 1024
+
+
+def _iter_records(path, offset=0, check_crc=False):
+    """Yields (data, end_offset) for complete TFRecords in path.
+
+    Starts reading at `offset`, which must be the offset of a record
+    boundary. Stops at the end of file or at an incomplete record,
+    which is read on a subsequent call once it's written.
+
+    If `check_crc` is True, record checksums are verified and reading
+    stops at the first invalid record.
+    """
+    try:
+        f = open(path, "rb")
+    except OSError as e:
+        log.warning("error reading TF events from %s: %s", path, e)
+        return
+    with f:
+        f.seek(offset)
+        buf = b""
+        pos = 0
+        while True:
+            record = _next_record(buf, pos, check_crc)
+            if record is None:
+                chunk = f.read(_READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                buf = buf[pos:] + chunk
+                pos = 0
+                continue
+            if record is _INVALID_RECORD:
+                log.warning(
+                    "error reading TF events from %s: invalid record checksum at %i",
+                    path,
+                    offset,
+                )
+                break
+            data, record_end = record
+            offset += record_end - pos
+            pos = record_end
+            yield data, offset
+
+
+_INVALID_RECORD = object()
+
+
+def _next_record(buf, pos, check_crc):
+    """Returns (data, record_end) for the record at pos in buf.
+
+    Returns None if buf doesn't contain a complete record at pos or
+    `_INVALID_RECORD` if `check_crc` is True and the record checksum
+    is invalid.
+    """
+    if len(buf) - pos < _RECORD_HEADER.size:
+        return None
+    data_len, len_crc = _RECORD_HEADER.unpack_from(buf, pos)
+    if check_crc and not _valid_crc(buf[pos:pos + 8], len_crc):
+        return _INVALID_RECORD
+    data_start = pos + _RECORD_HEADER.size
+    data_end = data_start + data_len
+    record_end = data_end + _RECORD_FOOTER.size
+    if record_end > len(buf):
+        return None
+    data = buf[data_start:data_end]
+    if check_crc:
+        (data_crc,) = _RECORD_FOOTER.unpack_from(buf, data_end)
+        if not _valid_crc(data, data_crc):
+            return _INVALID_RECORD
+    return data, record_end
+
+
+def _valid_crc(data, masked_crc):
+    return _masked_crc32c(data) == masked_crc
+
+
+def _crc32c_table():
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x82F63B78 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+_CRC32C_TABLE = _crc32c_table()
+
+
+def _masked_crc32c(data):
+    crc = 0xFFFFFFFF
+    table = _CRC32C_TABLE
+    for b in data:
+        crc = table[(crc ^ b) & 0xFF] ^ (crc >> 8)
+    crc ^= 0xFFFFFFFF
+    return (((crc >> 15) | (crc << 17)) + 0xA282EAD8) & 0xFFFFFFFF
+
+
+###################################################################
+# Event decoding
+###################################################################
+
+# Event, Summary, Summary.Value, and TensorProto field numbers - see
+# tensorboard/compat/proto/{event,summary,tensor,tensor_shape}.proto
+
+_EVENT_STEP = 2
+_EVENT_SUMMARY = 5
+_SUMMARY_VALUE = 1
+_VALUE_TAG = 1
+_VALUE_SIMPLE_VALUE = 2
+_VALUE_TENSOR = 8
+_VALUE_ONEOF_FIELDS = (2, 3, 4, 5, 6, 8)
+_TENSOR_DTYPE = 1
+_TENSOR_SHAPE = 2
+_TENSOR_CONTENT = 4
+_TENSOR_FLOAT_VAL = 5
+_TENSOR_DOUBLE_VAL = 6
+_TENSOR_STRING_VAL = 8
+_SHAPE_DIM = 2
+_SHAPE_UNKNOWN_RANK = 3
+_DIM_SIZE = 1
+
+_DT_FLOAT = 1
+_DT_DOUBLE = 2
+_DT_STRING = 7
+
+_WIRE_VARINT = 0
+_WIRE_64BIT = 1
+_WIRE_LEN = 2
+_WIRE_32BIT = 5
+
+
+class _DecodeError(Exception):
+    """Raised when an event can't be decoded by the fast-path decoder.
+
+    Events that raise this error are decoded using TensorBoard.
+    """
+
+
+def _event_scalars(data, path):
+    try:
+        step, values = _decode_event_values(data)
+        scalars = []
+        for value in values:
+            scalar_info = _value_scalar(value, step)
+            if scalar_info is not None:
+                scalars.append(scalar_info)
+        return scalars
+    except _DecodeError:
+        return _tb_event_scalars(data, path)
+
+
+def _tb_event_scalars(data, path):
+    event = _tb_decode_event(data, path)
+    if event is None:
+        return []
+    scalars = []
+    for val in event.summary.value:
+        try:
+            scalar_info = _try_scalar_event(event, val)
+        except Exception as e:
+            log.warning("error reading TF event from %s: %s", path, e)
+        else:
+            if scalar_info is not None:
+                scalars.append(scalar_info)
+    return scalars
+
+
+def _tb_decode_event(data, path):
+    from tensorboard.compat.proto import event_pb2
+
+    try:
+        return event_pb2.Event.FromString(data)
+    except Exception as e:
+        log.warning("error reading TF event from %s: %s", path, e)
+        return None
+
+
+def _decode_event_values(data):
+    """Returns (step, values) for encoded event data.
+
+    `values` is a list of `_SummaryValue` for the event summary.
+    """
+    step = 0
+    values = []
+    for field_num, wire_type, val in _decode_fields(data):
+        if field_num == _EVENT_STEP and wire_type == _WIRE_VARINT:
+            step = _int64(val)
+        elif field_num == _EVENT_SUMMARY and wire_type == _WIRE_LEN:
+            for field_num, wire_type, val in _decode_fields(val):
+                if field_num == _SUMMARY_VALUE and wire_type == _WIRE_LEN:
+                    values.append(_decode_summary_value(val))
+    return step, values
+
+
+class _SummaryValue:
+    def __init__(self, tag, kind, wire_type, val):
+        self.tag = tag
+        self.kind = kind
+        self.wire_type = wire_type
+        self.val = val
+
+
+def _decode_summary_value(data):
+    tag = ""
+    kind = wire_type = val = None
+    for field_num, field_wire_type, field_val in _decode_fields(data):
+        if field_num == _VALUE_TAG and field_wire_type == _WIRE_LEN:
+            tag = _decode_str(field_val)
+        elif field_num in _VALUE_ONEOF_FIELDS:
+            if field_num == kind and field_wire_type == _WIRE_LEN:
+                # Repeated message fields are merged - leave to TB
+                raise _DecodeError()
+            kind, wire_type, val = field_num, field_wire_type, field_val
+    return _SummaryValue(tag, kind, wire_type, val)
+
+
+def _decode_str(data):
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        raise _DecodeError() from None
+
+
+def _value_scalar(value, step):
+    if value.kind == _VALUE_TENSOR:
+        scalar_val = _tensor_scalar(value.val)
+        if scalar_val is not None:
+            return value.tag, scalar_val, step
+    elif value.kind == _VALUE_SIMPLE_VALUE:
+        if value.wire_type != _WIRE_32BIT:
+            raise _DecodeError()
+        return value.tag, _FLOAT.unpack(value.val)[0], step
+    return None
+
+
+_FLOAT = struct.Struct("<f")
+_DOUBLE = struct.Struct("<d")
+
+
+def _tensor_scalar(data):
+    """Returns the float value of a scalar tensor or None.
+
+    Raises `_DecodeError` for float tensors that aren't stored in one
+    of the common formats written by TF and TB summary writers.
+    """
+    dtype = None
+    shape = None
+    content = None
+    vals = []
+    for field_num, wire_type, val in _decode_fields(data):
+        if field_num == _TENSOR_DTYPE and wire_type == _WIRE_VARINT:
+            dtype = val
+        elif field_num == _TENSOR_SHAPE and wire_type == _WIRE_LEN:
+            shape = val
+        elif field_num == _TENSOR_CONTENT and wire_type == _WIRE_LEN:
+            content = val
+        elif field_num in (_TENSOR_FLOAT_VAL, _TENSOR_DOUBLE_VAL):
+            vals.append((field_num, wire_type, val))
+    if dtype not in (_DT_FLOAT, _DT_DOUBLE):
+        return None
+    if _num_elements(shape) != 1:
+        return None
+    fmt, vals_field = (
+        (_FLOAT, _TENSOR_FLOAT_VAL) if dtype == _DT_FLOAT  #
+        else (_DOUBLE, _TENSOR_DOUBLE_VAL)
+    )
+    if content:
+        if len(content) != fmt.size:
+            raise _DecodeError()
+        return fmt.unpack(content)[0]
+    return _single_tensor_val(vals, vals_field, fmt)
+
+
+def _num_elements(shape):
+    num = 1
+    if shape is None:
+        return num
+    for field_num, wire_type, val in _decode_fields(shape):
+        if field_num == _SHAPE_DIM and wire_type == _WIRE_LEN:
+            num *= _dim_size(val)
+        elif field_num == _SHAPE_UNKNOWN_RANK and val:
+            raise _DecodeError()
+    return num
+
+
+def _dim_size(data):
+    size = 0
+    for field_num, wire_type, val in _decode_fields(data):
+        if field_num == _DIM_SIZE and wire_type == _WIRE_VARINT:
+            size = _int64(val)
+    return size
+
+
+def _single_tensor_val(vals, vals_field, fmt):
+    decoded = []
+    for field_num, wire_type, val in vals:
+        if field_num != vals_field:
+            continue
+        if wire_type == _WIRE_LEN:
+            if len(val) % fmt.size:
+                raise _DecodeError()
+            decoded.extend(x for (x,) in fmt.iter_unpack(val))
+        elif len(val) == fmt.size:
+            decoded.append(fmt.unpack(val)[0])
+        else:
+            raise _DecodeError()
+    if len(decoded) != 1:
+        raise _DecodeError()
+    return decoded[0]
+
+
+def _decode_fields(data):
+    """Returns a list of (field_num, wire_type, val) for protobuf data.
+
+    `val` is an int for varint fields and bytes for other types.
+    """
+    fields = []
+    pos = 0
+    end = len(data)
+    while pos < end:
+        # Inline single byte varints, which are the common case for
+        # field keys and lengths
+        key = data[pos]
+        if key < 0x80:
+            pos += 1
+        else:
+            key, pos = _read_varint(data, pos)
+        wire_type = key & 0x07
+        if wire_type == _WIRE_LEN:
+            if pos < end and data[pos] < 0x80:
+                size = data[pos]
+                pos += 1
+            else:
+                size, pos = _read_varint(data, pos)
+            val = data[pos:pos + size]
+            pos += size
+        elif wire_type == _WIRE_VARINT:
+            val, pos = _read_varint(data, pos)
+        elif wire_type == _WIRE_32BIT:
+            val = data[pos:pos + 4]
+            pos += 4
+        elif wire_type == _WIRE_64BIT:
+            val = data[pos:pos + 8]
+            pos += 8
+        else:
+            raise _DecodeError()
+        if pos > end:
+            raise _DecodeError()
+        fields.append((key >> 3, wire_type, val))
+    return fields
+
+
+def _read_varint(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        try:
+            b = data[pos]
+        except IndexError:
+            raise _DecodeError() from None
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+        if shift >= 64:
+            raise _DecodeError()
+
+
+def _int64(val):
+    return val - (1 << 64) if val >= (1 << 63) else val
+
+
 def _try_scalar_event(event, val):
     if val.HasField("tensor"):
         scalar_val = _try_tensor_scalar(val)
@@ -166,18 +613,68 @@ def _ensure_tb_logging_patched():
 
 
 class AttrReader:
-    def __init__(self, dir):
+    def __init__(self, dir, check_crc=False):
         self.dir = dir
+        self.check_crc = check_crc
 
     def __iter__(self):
         """Yields (tag, val) for all logged attrs in dir."""
-        for event in EventReader(self.dir, path_filter=_is_summary_attrs):
-            for val in event.summary.value:
-                attr_info = _try_logged_attr(val)
-                if attr_info is not None:
+        for name in _attr_event_files(self.dir):
+            path = os.path.join(self.dir, name)
+            for data, _end_offset in _iter_records(path, 0, self.check_crc):
+                for attr_info in _event_attrs(data, path):
                     yield attr_info
 
 
+def _attr_event_files(dir):
+    return sorted(
+        name for name in _safe_listdir(dir)
+        if _is_summary_event_file(name) and _is_summary_attrs(name)
+    )
+
+
+def _event_attrs(data, path):
+    try:
+        _step, values = _decode_event_values(data)
+        return [
+            attr_info for attr_info in (_value_attr(value) for value in values)
+            if attr_info is not None
+        ]
+    except _DecodeError:
+        return _tb_event_attrs(data, path)
+
+
+def _tb_event_attrs(data, path):
+    event = _tb_decode_event(data, path)
+    if event is None:
+        return []
+    return [
+        attr_info
+        for attr_info in (_try_logged_attr(val) for val in event.summary.value)
+        if attr_info is not None
+    ]
+
+
+def _value_attr(value):
+    if value.kind != _VALUE_TENSOR:
+        return None
+    dtype = None
+    string_vals = []
+    for field_num, wire_type, val in _decode_fields(value.val):
+        if field_num == _TENSOR_DTYPE and wire_type == _WIRE_VARINT:
+            dtype = val
+        elif field_num == _TENSOR_STRING_VAL and wire_type == _WIRE_LEN:
+            string_vals.append(val)
+    if dtype != _DT_STRING:
+        return None
+    try:
+        text = b"".join(string_vals).decode("utf_8")
+    except Exception as e:
+        log.warning("Error decoding attr %s: %s", value.tag, e)
+        return None
+    return _strip_text_summary_suffix(value.tag), text
+
+
 def _is_summary_attrs(path):
     return path.endswith(".attrs")
 
@@ -939,12 +939,24 @@ def wait_forever(sleep_interval=0.1):
         time.sleep(sleep_interval)
 
 
+# Run output index files contain an entry for each line of run output.
+# Version 1 index files contain a time (ms) and stream type for each
+# line and must be read in step with the output file. Version 2 index
+# files start with a header and include the output file offset of
+# each line so that any range of lines can be read directly.
+
+RUN_OUTPUT_INDEX_HEADER = b"\xffGOI\x00\x00\x00\x02"
+RUN_OUTPUT_INDEX_ENTRY = struct.Struct("!QBQ")
+RUN_OUTPUT_INDEX_V1_ENTRY = struct.Struct("!QB")
+
+
 class RunOutputReader:
     def __init__(self, run_dir):
         self.run_dir = run_dir
         self._lines = []
         self._output = None
         self._index = None
+        self._index_version = None
 
     def read(self, start=0, end=None):
         """Read run output from start to end.
@@ -953,13 +965,61 @@ class RunOutputReader:
         and are both inclusive. Note this is different from the Python
         slice function where end is exclusive.
         """
-        self._read_next(end)
         if end is None:
             slice_end = None
         else:
             slice_end = end + 1
+        if self._is_indexed():
+            return self._read_indexed(slice(start, slice_end))
+        self._read_next(end)
         return self._lines[start:slice_end]
 
+    def tail(self, count):
+        """Read the last count lines of run output."""
+        if count < 1:
+            return []
+        if self._is_indexed():
+            return self._read_indexed(slice(-count, None))
+        self._read_next(None)
+        return self._lines[-count:]
+
+    def _is_indexed(self):
+        if self._index_version is None:
+            _output, index = self._ensure_open()
+            index.seek(0)
+            header = index.read(len(RUN_OUTPUT_INDEX_HEADER))
+            if len(header) < len(RUN_OUTPUT_INDEX_HEADER):
+                # Version isn't known until an entry or header is
+                # written.
+                index.seek(0)
+                return False
+            if header == RUN_OUTPUT_INDEX_HEADER:
+                self._index_version = 2
+            else:
+                self._index_version = 1
+                index.seek(0)
+        return self._index_version == 2
+
+    def _read_indexed(self, line_slice):
+        output, index = self._ensure_open()
+        entry_size = RUN_OUTPUT_INDEX_ENTRY.size
+        index_size = os.fstat(index.fileno()).st_size
+        line_count = (index_size - len(RUN_OUTPUT_INDEX_HEADER)) // entry_size
+        start, stop, _step = line_slice.indices(line_count)
+        if start >= stop:
+            return []
+        index.seek(len(RUN_OUTPUT_INDEX_HEADER) + start * entry_size)
+        entries = RUN_OUTPUT_INDEX_ENTRY.iter_unpack(
+            index.read((stop - start) * entry_size)
+        )
+        lines = []
+        for time, stream, offset in entries:
+            if output.tell() != offset:
+                output.seek(offset)
+            line = output.readline().rstrip().decode()
+            lines.append((time, stream, line))
+        return lines
+
     def _read_next(self, end):
         if end is not None and end < len(self._lines):
             return
@@ -970,15 +1030,16 @@ class RunOutputReader:
                 raise
         else:
             lines = self._lines
+            entry_size = RUN_OUTPUT_INDEX_V1_ENTRY.size
             while True:
-                line = output.readline().rstrip().decode()
+                line = output.readline()
                 if not line:
                     break
-                header = index.read(9)
-                if len(header) < 9:
+                header = index.read(entry_size)
+                if len(header) < entry_size:
                     break
-                time, stream = struct.unpack("!QB", header)
-                lines.append((time, stream, line))
+                time, stream = RUN_OUTPUT_INDEX_V1_ENTRY.unpack(header)
+                lines.append((time, stream, line.rstrip().decode()))
                 if end is not None and end < len(self._lines):
                     break
 
@@ -1055,11 +1116,17 @@ def is_executable_file(path):
     return os.path.isfile(path) and os.access(path, os.X_OK)
 
 
-def copytree(src, dest, preserve_links=True):
+def copytree(src, dest, preserve_links=True, copy_function=None):
     try:
         # dirs_exist_ok was added in Python 3.8:
         # https://docs.python.org/3/library/shutil.html#shutil.copytree
-        shutil.copytree(src, dest, symlinks=preserve_links, dirs_exist_ok=True)
+        shutil.copytree(
+            src,
+            dest,
+            symlinks=preserve_links,
+            copy_function=copy_function or shutil.copy2,
+            dirs_exist_ok=True,
+        )
     except TypeError as e:
         assert "got an unexpected keyword argument 'dirs_exist_ok'" in str(e), e
         # Drop this fallback when drop support for Python 3.7
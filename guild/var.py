@@ -70,7 +70,7 @@ def runs(root=None, sort=None, filter=None, force_root=False, base_runs=None):
     )
     runs = [run for run in all_runs() if filter(run)]
     if sort:
-        runs = sorted(runs, key=_run_sort_key(sort))
+        runs = _sort_runs(runs, sort)
     return runs
 
 
@@ -165,9 +165,19 @@ def run_filter(name, *args):
 
 
 def _all_runs(root):
+    if os.getenv("NO_RUN_CATALOG") != "1":
+        runs = _catalog_runs(root)
+        if runs is not None:
+            return runs
     return [runlib.Run(name, path) for name, path in _iter_dirs(root)]
 
 
+def _catalog_runs(root):
+    from guild import run_catalog
+
+    return run_catalog.runs(root)
+
+
 def iter_run_dirs(root=None):
     return _iter_dirs(root or runs_dir())
 
@@ -188,28 +198,35 @@ def _opref_exists(run_dir):
     return os.path.exists(opref_path)
 
 
-def _run_sort_key(sort):
-    return functools.cmp_to_key(lambda x, y: _run_cmp(x, y, sort))
+def _sort_runs(runs, sort):
+    # Read sort attrs once per run rather than once per comparison.
+    keyed = [
+        ([_run_attr(run, _sort_attr_name(attr)) for attr in sort], run) for run in runs
+    ]
+    keyed.sort(key=_run_vals_sort_key(sort))
+    return [run for _vals, run in keyed]
+
 
+def _sort_attr_name(attr):
+    return attr[1:] if attr.startswith("-") else attr
 
-def _run_cmp(x, y, sort):
-    for attr in sort:
-        attr_cmp = _run_attr_cmp(x, y, attr)
+
+def _run_vals_sort_key(sort):
+    return functools.cmp_to_key(lambda x, y: _run_vals_cmp(x[0], y[0], sort))
+
+
+def _run_vals_cmp(x_vals, y_vals, sort):
+    for x_val, y_val, attr in zip(x_vals, y_vals, sort):
+        attr_cmp = _run_val_cmp(x_val, y_val, attr)
         if attr_cmp != 0:
             return attr_cmp
     return 0
 
 
-def _run_attr_cmp(x, y, attr):
-    if attr.startswith("-"):
-        attr = attr[1:]
-        rev = -1
-    else:
-        rev = 1
-    x_val = _run_attr(x, attr)
+def _run_val_cmp(x_val, y_val, attr):
+    rev = -1 if attr.startswith("-") else 1
     if x_val is None:
         return -rev
-    y_val = _run_attr(y, attr)
     if y_val is None:
         return rev
     return rev * ((x_val > y_val) - (x_val < y_val))
@@ -222,6 +239,7 @@ def _run_attr(run, name):
 
 
 def delete_runs(runs, permanent=False):
+    store = _sourcecode_store_for_gc(runs) if permanent else None
     for run in runs:
         src = run.dir
         if permanent:
@@ -229,11 +247,16 @@ def delete_runs(runs, permanent=False):
         else:
             dest = os.path.join(runs_dir(deleted=True), run.id)
             _move(src, dest)
+    if store:
+        _gc_sourcecode_store(store)
 
 
 def purge_runs(runs):
+    store = _sourcecode_store_for_gc(runs)
     for run in runs:
         _delete_run(run.dir)
+    if store:
+        _gc_sourcecode_store(store)
 
 
 def _delete_run(src):
@@ -243,6 +266,26 @@ def _delete_run(src):
     shutil.rmtree(src)
 
 
+def _sourcecode_store_for_gc(runs):
+    """Returns the source code store if it needs to be collected.
+
+    Must be called before `runs` are deleted.
+    """
+    from guild import sourcecode_store
+
+    if not runs:
+        return None
+    store = sourcecode_store.SourceCodeStore()
+    if not store.gc_needed([run.dir for run in runs]):
+        return None
+    return store
+
+
+def _gc_sourcecode_store(store):
+    removed = store.gc()
+    log.debug("removed %i file(s) from source code store", removed)
+
+
 def _move(src, dest):
     util.ensure_dir(os.path.dirname(dest))
     log.debug("moving %s to %s", src, dest)
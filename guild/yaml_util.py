@@ -17,6 +17,10 @@ import re
 
 import yaml
 
+# LibYAML based loader, which is considerably faster than the pure
+# Python loader when available.
+_FastSafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
 
 def encode_yaml(val, default_flow_style=False, strict=False):
     """Returns val encoded as YAML.
@@ -52,6 +56,11 @@ def decode_yaml(s):
         raise ValueError(e) from e
 
 
+def fast_safe_load(s):
+    """Same as `yaml.safe_load` but uses LibYAML when available."""
+    return yaml.load(s, Loader=_FastSafeLoader)
+
+
 def yaml_front_matter(filename):
     fm_s = _yaml_front_matter_s(filename)
     if not fm_s: